@@ -12,35 +12,132 @@ Key features:
 """
 
 import argparse
+import contextlib
+import functools
+import hashlib
+import importlib.util
 import json
 import logging
 import math
 import os
-import random
+import re
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, cast
 
 import numpy as np
 import requests
 import torch
+import torch.distributed as dist
 import torch.nn.functional as F
 from numpy.typing import NDArray
+from requests.adapters import HTTPAdapter
+from torch.distributed.fsdp import (
+    FullStateDictConfig,
+    MixedPrecision,
+    ShardingStrategy,
+    StateDictType,
+)
+from torch.distributed.fsdp import FullyShardedDataParallel as FSDP
+from torch.distributed.fsdp.wrap import transformer_auto_wrap_policy
+from torch.nn.utils.rnn import pad_sequence
 from torch.optim import AdamW
+from torch.utils.checkpoint import checkpoint
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
     PreTrainedModel,
     PreTrainedTokenizerBase,
 )
+from typing_extensions import NotRequired
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Sequence lengths are padded to a multiple of this so batches line up with the
+# fused attention kernels' tile sizes.
+PAD_MULTIPLE = 128
+
+# Batches per length bucket when ordering an epoch; larger buckets mix lengths more
+LENGTH_BUCKET_BATCHES = 50
+
+# Concurrent trajectory downloads in load_training_data
+FETCH_WORKERS = 32
+
+# torch.from_numpy, pad_sequence and F.pad accept uint16 tensors from torch 2.3
+_TORCH_HAS_UINT16 = tuple(int(v) for v in torch.__version__.split(".")[:2]) >= (2, 3)
+
+# Assistant turn content in ChatML; an unterminated final turn runs to end of text
+_ASSISTANT_SPAN_RE = re.compile(r"<\|im_start\|>assistant\n(.*?)(?:<\|im_end\|>|\Z)", re.DOTALL)
+
+
+def _label_logprobs(logits: torch.Tensor, labels: torch.Tensor) -> torch.Tensor:
+    """
+    Log-prob of each label token, zero where the label is -100.
+
+    Only rows with a valid label go through log-softmax, so the full
+    (batch, seq, vocab) log-prob tensor is never materialized.
+    """
+    valid = labels != -100
+    sel_labels = labels[valid]
+    sel_logp = torch.log_softmax(logits[valid].float(), dim=-1)
+    sel_logp = sel_logp.gather(-1, sel_labels.unsqueeze(-1)).squeeze(-1)
+    logp = torch.zeros(labels.shape, dtype=sel_logp.dtype, device=logits.device)
+    logp[valid] = sel_logp
+    return logp
+
+
+def _checkpointed(forward: Callable[..., torch.Tensor]) -> Callable[..., torch.Tensor]:
+    """Wrap a module forward so its activations are recomputed in backward"""
+
+    def wrapper(*args, **kwargs) -> torch.Tensor:
+        if not torch.is_grad_enabled():
+            return forward(*args, **kwargs)
+        # Non-reentrant checkpointing replays the recompute under the same autocast state
+        return cast(torch.Tensor, checkpoint(forward, *args, use_reentrant=False, **kwargs))
+
+    return wrapper
+
+
+def _grpo_loss(
+    logp: torch.Tensor,
+    ref_logp: torch.Tensor,
+    labels: torch.Tensor,
+    advantages: torch.Tensor,
+    kl_coefficient: float,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    GRPO objective with KL penalty, masked to the assistant tokens.
+
+    Kept as one function so torch.compile can fuse the masked reductions into a
+    single pass. Returns the total loss and the (detached) mean KL divergence.
+    """
+    # Mask for valid tokens
+    mask = (labels != -100).float()
+    mask_sum = mask.sum(dim=-1).clamp_min(1e-8)
+
+    # KL divergence
+    kl = ((logp - ref_logp) * mask).sum(dim=-1) / mask_sum
+
+    # GRPO loss
+    grpo_term = torch.exp(logp - logp.detach())
+    grpo_loss = (((-grpo_term * mask).sum(-1) / mask_sum) * advantages.squeeze(-1)).mean()
+
+    # KL penalty
+    kl_loss = kl_coefficient * kl.mean()
+
+    return grpo_loss + kl_loss, kl.mean().detach()
+
 
 class TrainingExample(TypedDict):
     trajectory_id: str
-    tokens: NDArray[np.int32]
-    mask: NDArray[np.int32]
+    # CPU tensors: token ids in GRPOTrainer.token_dtype, mask True on trained
+    # (assistant) tokens. Widened to int64 on device after the H2D copy.
+    tokens: torch.Tensor
+    mask: torch.Tensor
     score: float
+    # fp16, filled in by GRPOTrainer._precompute_ref_logp before training
+    ref_logp: NotRequired[torch.Tensor]
 
 
 class GRPOTrainer:
@@ -64,6 +161,10 @@ class GRPOTrainer:
         max_grad_norm: float = 1.0,
         kl_coefficient: float = 0.1,
         device: str = "cuda" if torch.cuda.is_available() else "cpu",
+        compile_model: bool = True,
+        optimizer: str = "adamw",
+        fsdp: bool = False,
+        seed: int = 0,
     ):
         self.model_name = model_name
         self.storage_url = storage_url
@@ -74,54 +175,237 @@ class GRPOTrainer:
         self.max_grad_norm = max_grad_norm
         self.kl_coefficient = kl_coefficient
         self.device = device
+        self.compile_model = compile_model
+        self.optimizer_name = optimizer
+        self.fsdp = fsdp
+        self.seed = seed
 
         self.model: PreTrainedModel | None = None
         self.ref_model: PreTrainedModel | None = None
+        # Forward callables used in train_step; torch.compile'd wrappers when enabled
+        self.policy_forward: torch.nn.Module | None = None
+        self.ref_forward: torch.nn.Module | None = None
+        # FSDP wrapper around self.model when sharding is enabled
+        self.sharded_policy: FSDP | None = None
+        self.loss_fn: Callable[..., tuple[torch.Tensor, torch.Tensor]] = _grpo_loss
         self.tokenizer: PreTrainedTokenizerBase | None = None
+        # Narrowest dtype holding every token id; set from the vocabulary in setup()
+        self.token_dtype: np.dtype = np.dtype(np.int32)
         self.optimizer: torch.optim.Optimizer | None = None
+        # Keep-alive connection pool shared by all storage requests
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=FETCH_WORKERS)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # Side stream for async host-to-device batch copies
+        self._copy_stream: torch.cuda.Stream | None = (
+            torch.cuda.Stream() if device.startswith("cuda") else None
+        )
 
     def setup(self, reference_model_cid: str | None = None):
         """Initialize models and optimizer"""
         logger.info(f"Loading model: {self.model_name}")
+        if self.fsdp:
+            self._init_distributed()
 
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+        vocab_fits_uint16 = len(self.tokenizer) <= np.iinfo(np.uint16).max + 1
+        use_uint16 = vocab_fits_uint16 and _TORCH_HAS_UINT16
+        self.token_dtype = np.dtype(np.uint16 if use_uint16 else np.int32)
 
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_name, torch_dtype=torch.bfloat16, trust_remote_code=True
-        )
+        # bf16 compute under autocast; fp32 matmuls (e.g. the loss) may use TF32
+        torch.backends.cuda.matmul.allow_bf16_reduced_precision_reduction = True
+        torch.set_float32_matmul_precision("high")
+
+        # Policy keeps fp32 master weights for the optimizer; forwards run in bf16
+        self.model = self._load_causal_lm(self.model_name, torch_dtype=torch.float32)
         device = torch.device(self.device)
-        self.model = cast(PreTrainedModel, torch.nn.Module.to(self.model, device))
-        self.model.gradient_checkpointing_enable()
+        if not self.fsdp:
+            # Under FSDP, weights move to the GPU shard by shard when wrapped
+            self.model = cast(PreTrainedModel, torch.nn.Module.to(self.model, device))
+        self._enable_gradient_checkpointing(self.model)
         self.model.train()
 
         # Load or clone reference model
         if reference_model_cid:
             ref_path = self._download_model(reference_model_cid)
-            self.ref_model = AutoModelForCausalLM.from_pretrained(
-                ref_path, torch_dtype=torch.bfloat16, trust_remote_code=True
-            )
+            self.ref_model = self._load_causal_lm(ref_path)
         else:
             # Clone current model as reference
-            self.ref_model = AutoModelForCausalLM.from_pretrained(
-                self.model_name, torch_dtype=torch.bfloat16, trust_remote_code=True
-            )
+            self.ref_model = self._load_causal_lm(self.model_name)
 
-        self.ref_model = cast(PreTrainedModel, torch.nn.Module.to(self.ref_model, device))
+        if not self.fsdp:
+            self.ref_model = cast(PreTrainedModel, torch.nn.Module.to(self.ref_model, device))
         self.ref_model.eval()
         for param in self.ref_model.parameters():
             param.requires_grad = False
 
-        self.optimizer = AdamW(self.model.parameters(), lr=self.learning_rate)
+        self.policy_forward = self.model
+        self.ref_forward = self.ref_model
+        if self.fsdp:
+            self.sharded_policy = self._shard(self.model, ShardingStrategy.FULL_SHARD)
+            self.policy_forward = self.sharded_policy
+            self.ref_forward = self._shard(self.ref_model, ShardingStrategy.SHARD_GRAD_OP)
+
+        self.optimizer = self._build_optimizer(self.policy_forward)
+
+        if self.compile_model:
+            # Lengths are bucketed to PAD_MULTIPLE, so recompiles stay bounded
+            torch._dynamo.config.cache_size_limit = 128
+            # CUDA graphs cannot capture FSDP's per-layer all-gathers
+            mode = "default" if self.fsdp else "reduce-overhead"
+            self.policy_forward = cast(
+                torch.nn.Module, torch.compile(self.policy_forward, mode=mode, fullgraph=False)
+            )
+            self.ref_forward = cast(
+                torch.nn.Module, torch.compile(self.ref_forward, mode=mode, fullgraph=False)
+            )
+            # Loss-side pointwise ops and masked reductions fuse into one kernel
+            self.loss_fn = torch.compile(_grpo_loss, fullgraph=True, dynamic=False)
 
         logger.info(f"Model loaded on {self.device}")
 
+    def _enable_gradient_checkpointing(self, model: PreTrainedModel) -> None:
+        """
+        Recompute only the decoder MLPs in backward.
+
+        The MLP activations dominate per-layer memory, while attention is cheap to
+        keep with fused kernels, so attention is left uncheckpointed. Models without
+        a ``model.layers[i].mlp`` layout fall back to full-layer checkpointing.
+        """
+        layers = getattr(getattr(model, "model", None), "layers", None)
+        if layers is None or not all(hasattr(layer, "mlp") for layer in layers):
+            logger.info("Selective checkpointing unsupported; checkpointing full layers")
+            model.gradient_checkpointing_enable(
+                gradient_checkpointing_kwargs={"use_reentrant": False}
+            )
+            return
+
+        for layer in layers:
+            layer.mlp.forward = _checkpointed(layer.mlp.forward)
+
+    def _init_distributed(self) -> None:
+        """Join the torchrun process group and pin this rank to its local GPU"""
+        if not self.device.startswith("cuda"):
+            raise ValueError("FSDP training requires a CUDA device")
+        if not dist.is_initialized():
+            dist.init_process_group(backend="nccl")
+        torch.cuda.set_device(int(os.environ.get("LOCAL_RANK", "0")))
+        # The copy stream must live on this rank's device
+        self._copy_stream = torch.cuda.Stream()
+
+    def _shard(self, model: PreTrainedModel, strategy: ShardingStrategy) -> FSDP:
+        """Wrap a model in FSDP with one unit per decoder layer and bf16 compute"""
+        layers = getattr(getattr(model, "model", None), "layers", None)
+        wrap_policy = None
+        if layers is not None:
+            wrap_policy = functools.partial(
+                transformer_auto_wrap_policy,
+                transformer_layer_cls={type(layer) for layer in layers},
+            )
+        return FSDP(
+            model,
+            auto_wrap_policy=wrap_policy,
+            mixed_precision=MixedPrecision(param_dtype=torch.bfloat16, reduce_dtype=torch.float32),
+            sharding_strategy=strategy,
+            device_id=torch.cuda.current_device(),
+            use_orig_params=True,
+        )
+
+    def _is_main_process(self) -> bool:
+        return not dist.is_initialized() or dist.get_rank() == 0
+
+    def _build_optimizer(self, model: torch.nn.Module) -> torch.optim.Optimizer:
+        """
+        Build the optimizer.
+
+        "adamw" uses the fused single-kernel CUDA update when on GPU.
+        "adamw8bit" uses bitsandbytes' blockwise-quantized states (~4x smaller
+        than fp32 m/v), for larger models when VRAM is tight.
+        """
+        params = [p for p in model.parameters() if p.requires_grad]
+        if self.optimizer_name == "adamw8bit":
+            try:
+                import bitsandbytes as bnb
+
+                return bnb.optim.AdamW8bit(params, lr=self.learning_rate)
+            except ImportError:
+                logger.warning("bitsandbytes not installed, falling back to AdamW")
+        elif self.optimizer_name != "adamw":
+            raise ValueError(f"Unknown optimizer: {self.optimizer_name}")
+
+        return AdamW(params, lr=self.learning_rate, fused=self.device.startswith("cuda"))
+
+    def _load_causal_lm(
+        self, name_or_path: str, torch_dtype: torch.dtype = torch.bfloat16
+    ) -> PreTrainedModel:
+        """Load a causal LM with the fastest attention backend available"""
+        attn_implementation = self._attn_implementation()
+        try:
+            return AutoModelForCausalLM.from_pretrained(
+                name_or_path,
+                torch_dtype=torch_dtype,
+                trust_remote_code=True,
+                attn_implementation=attn_implementation,
+            )
+        except (ImportError, ValueError) as e:
+            logger.warning(
+                f"attn_implementation={attn_implementation!r} unsupported ({e}), using eager"
+            )
+            return AutoModelForCausalLM.from_pretrained(
+                name_or_path,
+                torch_dtype=torch_dtype,
+                trust_remote_code=True,
+                attn_implementation="eager",
+            )
+
+    def _attn_implementation(self) -> str:
+        """Prefer FlashAttention-2 on CUDA when installed, otherwise PyTorch SDPA"""
+        if self.device.startswith("cuda") and importlib.util.find_spec("flash_attn") is not None:
+            return "flash_attention_2"
+        return "sdpa"
+
+    def _accumulation_context(self, sync_step: bool) -> contextlib.AbstractContextManager:
+        """Skip the gradient all-reduce on micro-steps that don't hit the optimizer"""
+        if not sync_step and self.sharded_policy is not None:
+            return self.sharded_policy.no_sync()
+        return contextlib.nullcontext()
+
+    def _clip_grad_norm(self) -> torch.Tensor:
+        """Clip gradients to max_grad_norm; under FSDP the norm spans all shards"""
+        if self.sharded_policy is not None:
+            return self.sharded_policy.clip_grad_norm_(self.max_grad_norm)
+        assert self.model is not None, "Model not initialized"
+        return torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=self.max_grad_norm)
+
+    def _autocast(self) -> torch.autocast:
+        """bf16 autocast for forward passes on the training device"""
+        return torch.autocast(device_type=torch.device(self.device).type, dtype=torch.bfloat16)
+
+    def _attention_context(self) -> contextlib.AbstractContextManager:
+        """Restrict SDPA to the fused FlashAttention / memory-efficient kernels on CUDA"""
+        if not self.device.startswith("cuda"):
+            return contextlib.nullcontext()
+        try:
+            from torch.nn.attention import SDPBackend, sdpa_kernel
+        except ImportError:
+            return contextlib.nullcontext()
+        return sdpa_kernel([SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION])
+
     def load_training_data(
-        self, trajectory_manifest_cid: str, rewards_cid: str
+        self, trajectory_manifest_cid: str, rewards_cid: str, cache_dir: str | None = None
     ) -> list[TrainingExample]:
-        """Load trajectories and rewards from Jeju Storage"""
+        """Load trajectories and rewards from Jeju Storage
+
+        With ``cache_dir`` set, tokenized trajectories are memory-mapped from disk
+        and only trajectories missing from the cache are fetched and tokenized.
+        """
         assert self.tokenizer is not None, "Tokenizer not initialized - call setup() first"
         logger.info(f"Loading trajectories from {trajectory_manifest_cid}")
 
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
         # Load manifest
         manifest = self._fetch_from_storage(trajectory_manifest_cid)
 
@@ -129,52 +413,102 @@ class GRPOTrainer:
         rewards_data = self._fetch_from_storage(rewards_cid)
         scores_by_id = {s["trajectoryId"]: s for s in rewards_data.get("scores", [])}
 
+        # Tokenized trajectories already in the cache need no fetch
+        trajectory_cids: list[str] = manifest.get("trajectoryCIDs", [])
+        cached = {
+            cid: hit
+            for cid in trajectory_cids
+            if cache_dir and (hit := self._load_cached_example(cache_dir, cid)) is not None
+        }
+        missing = [cid for cid in trajectory_cids if cid not in cached]
+        fetched = dict(zip(missing, self._fetch_many(missing), strict=True))
+
         # Load and match trajectories
         training_data: list[TrainingExample] = []
-        for traj_cid in manifest.get("trajectoryCIDs", []):
-            trajectory = self._fetch_from_storage(traj_cid)
-            traj_id_value = trajectory.get("id")
-            if not isinstance(traj_id_value, str) or not traj_id_value:
-                logger.warning(f"Skipping trajectory with invalid id: {traj_id_value!r}")
-                continue
-            traj_id = traj_id_value
-
-            if traj_id not in scores_by_id:
-                continue
+        for traj_cid in trajectory_cids:
+            if traj_cid in cached:
+                traj_id, tokens, mask = cached[traj_cid]
+                if traj_id not in scores_by_id:
+                    continue
+            else:
+                trajectory = fetched[traj_cid]
+                traj_id_value = trajectory.get("id")
+                if not isinstance(traj_id_value, str) or not traj_id_value:
+                    logger.warning(f"Skipping trajectory with invalid id: {traj_id_value!r}")
+                    continue
+                traj_id = traj_id_value
+
+                if traj_id not in scores_by_id:
+                    continue
+
+                # Convert trajectory to training format (train on assistant tokens only)
+                messages = self._trajectory_to_messages(trajectory)
+                tokens, mask = self._tokenize_with_mask(messages)
+                if cache_dir:
+                    self._save_cached_example(cache_dir, traj_cid, traj_id, tokens, mask)
 
             score_value = scores_by_id[traj_id]["score"]
             score = float(score_value) if isinstance(score_value, (int, float)) else 0.0
 
-            # Convert trajectory to training format
-            messages = self._trajectory_to_messages(trajectory)
-            tokens_batch = self.tokenizer.apply_chat_template(
-                messages, return_tensors="pt", truncation=True, max_length=self.max_seq_len
-            )
-            if not isinstance(tokens_batch, torch.Tensor):
-                raise TypeError(
-                    "Expected torch.Tensor from tokenizer.apply_chat_template(return_tensors='pt')"
-                )
-            tokens = tokens_batch[0]
-            if not isinstance(tokens, torch.Tensor):
-                raise TypeError("Expected torch.Tensor row from tokenizer output")
-
-            # Create mask (train on assistant tokens only)
-            mask = self._create_training_mask(messages, tokens)
-
-            tokens_np: NDArray[np.int32] = tokens.to(torch.int32).cpu().numpy()
-            mask_np: NDArray[np.int32] = mask.to(torch.int32).cpu().numpy()
             training_data.append(
                 {
                     "trajectory_id": traj_id,
-                    "tokens": tokens_np,
-                    "mask": mask_np,
+                    "tokens": torch.from_numpy(tokens),
+                    "mask": torch.from_numpy(mask),
                     "score": score,
                 }
             )
 
+        if cache_dir:
+            logger.info(f"Tokenization cache: {len(cached)} hits in {cache_dir}")
         logger.info(f"Loaded {len(training_data)} training examples")
         return training_data
 
+    def _cache_key(self, traj_cid: str) -> str:
+        """Cache key for a tokenized trajectory under the current tokenizer settings"""
+        key = f"{self.model_name}\0{self.max_seq_len}\0{self.token_dtype}\0{traj_cid}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _load_cached_example(
+        self, cache_dir: str, traj_cid: str
+    ) -> tuple[str, NDArray[np.integer], NDArray[np.bool_]] | None:
+        """Memory-map a cached (tokens, mask) record; None on a cache miss"""
+        base = os.path.join(cache_dir, self._cache_key(traj_cid))
+        try:
+            with open(f"{base}.json") as f:
+                traj_id = json.load(f)["trajectory_id"]
+            # Copy-on-write maps are writable, so torch.from_numpy can wrap them as-is
+            tokens = np.load(f"{base}.tokens.npy", mmap_mode="c")
+            mask = np.load(f"{base}.mask.npy", mmap_mode="c")
+        except (OSError, ValueError, KeyError):
+            return None
+        # The mask is stored as 0/1 bytes; viewing it as bool keeps it mapped
+        return traj_id, tokens, mask.view(np.bool_)
+
+    def _save_cached_example(
+        self,
+        cache_dir: str,
+        traj_cid: str,
+        traj_id: str,
+        tokens: NDArray[np.integer],
+        mask: NDArray[np.bool_],
+    ) -> None:
+        """
+        Write a tokenized trajectory to the cache; the sidecar is renamed in last.
+
+        Temp files carry the pid, so torchrun ranks sharing ``cache_dir`` each
+        publish a complete record instead of racing on one temp name.
+        """
+        base = os.path.join(cache_dir, self._cache_key(traj_cid))
+        tmp = f"{os.getpid()}.tmp"
+        for name, array in (("tokens", tokens), ("mask", mask.astype(np.uint8))):
+            with open(f"{base}.{name}.npy.{tmp}", "wb") as f:
+                np.save(f, array)
+            os.replace(f"{base}.{name}.npy.{tmp}", f"{base}.{name}.npy")
+        with open(f"{base}.json.{tmp}", "w") as f:
+            json.dump({"trajectory_id": traj_id, "length": len(tokens)}, f)
+        os.replace(f"{base}.json.{tmp}", f"{base}.json")
+
     def _trajectory_to_messages(self, trajectory: dict) -> list[dict]:
         """Convert trajectory to chat messages"""
         messages = []
@@ -210,130 +544,187 @@ class GRPOTrainer:
 
         return messages
 
-    def _create_training_mask(self, messages: list[dict], tokens: torch.Tensor) -> torch.Tensor:
-        """Create mask for training (1 for assistant tokens, -100 for others)"""
+    def _tokenize_with_mask(
+        self, messages: list[dict]
+    ) -> tuple[NDArray[np.integer], NDArray[np.bool_]]:
+        """
+        Tokenize a conversation and build its training mask.
+
+        Token ids use ``self.token_dtype``; the mask is True on assistant content.
+        Assistant spans are located in the rendered text in one regex pass and
+        mapped to tokens through the fast tokenizer's offset mapping, so the
+        conversation is encoded exactly once.
+        """
         assert self.tokenizer is not None, "Tokenizer not initialized"
-        mask = torch.full_like(tokens, -100)
-
-        # Simple approach: find assistant response regions
-        # In practice, use tokenizer's chat template metadata
         text = self.tokenizer.apply_chat_template(messages, tokenize=False)
         if not isinstance(text, str):
             raise TypeError("Expected str from tokenizer.apply_chat_template(tokenize=False)")
 
-        # Find assistant sections and mark them
-        assistant_start = "<|im_start|>assistant"
-        assistant_end = "<|im_end|>"
-
-        start_idx = 0
-        while True:
-            start = text.find(assistant_start, start_idx)
-            if start == -1:
-                break
-
-            end = text.find(assistant_end, start)
-            if end == -1:
-                end = len(text)
-
-            # Get token positions for this range
-            prefix = text[: start + len(assistant_start) + 1]
-            content = text[start + len(assistant_start) + 1 : end]
-
-            prefix_tokens = len(self.tokenizer.encode(prefix))
-            content_tokens = len(self.tokenizer.encode(content))
+        enc = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            truncation=True,
+            max_length=self.max_seq_len,
+        )
+        tokens = np.asarray(enc["input_ids"], dtype=self.token_dtype)
+        offsets = np.asarray(enc["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+
+        spans = np.array(
+            [m.span(1) for m in _ASSISTANT_SPAN_RE.finditer(text)], dtype=np.int64
+        ).reshape(-1, 2)
+        in_assistant = (
+            (offsets[None, :, 0] >= spans[:, 0, None]) & (offsets[None, :, 1] <= spans[:, 1, None])
+        ).any(axis=0)
+
+        return tokens, in_assistant
+
+    def _to_device(self, *tensors: torch.Tensor) -> list[torch.Tensor]:
+        """Copy host tensors to the device from pinned memory on the dedicated copy stream"""
+        if self._copy_stream is None:
+            return [t.to(self.device) for t in tensors]
+
+        with torch.cuda.stream(self._copy_stream):
+            moved = [t.pin_memory().to(self.device, non_blocking=True) for t in tensors]
+        compute_stream = torch.cuda.current_stream()
+        compute_stream.wait_stream(self._copy_stream)
+        for t in moved:
+            t.record_stream(compute_stream)
+        return moved
+
+    def _collate(self, batch_data: list[TrainingExample]) -> tuple[torch.Tensor, torch.Tensor]:
+        """Pad a batch and shift it into (input tokens, next-token labels)"""
+        tokens = pad_sequence([item["tokens"] for item in batch_data], batch_first=True)
+        masks = pad_sequence([item["mask"] for item in batch_data], batch_first=True)
 
-            # Mark these tokens as trainable
-            for i in range(prefix_tokens, min(prefix_tokens + content_tokens, len(mask))):
-                mask[i] = tokens[i]
+        # Pad sequences
+        pad_len = -tokens.size(1) % PAD_MULTIPLE
+        tokens = F.pad(tokens, (0, pad_len), value=0)
+        masks = F.pad(masks, (0, pad_len), value=False)
+
+        # Copy the compact host tensors, then widen ids and build labels on device
+        tokens, masks = self._to_device(tokens, masks)
+        tokens = tokens.long()
+        labels = torch.where(masks[:, 1:], tokens[:, 1:], -100)
+        return tokens[:, :-1].contiguous(), labels
+
+    def _precompute_ref_logp(self, training_data: list[TrainingExample]) -> None:
+        """
+        Cache per-token reference log-probs on each example.
+
+        The reference model is frozen, so its log-probs are identical every epoch.
+        Computing them once up front removes the reference forward from train_step.
+        Afterwards the reference weights are offloaded to CPU to free GPU memory,
+        and moved back here on the next train() call.
+        """
+        if self.ref_forward is None:
+            raise RuntimeError("Reference model not loaded - call setup() first")
+        self._move_reference(self.device)
+        logger.info(f"Precomputing reference log-probs for {len(training_data)} examples")
+
+        for start in range(0, len(training_data), self.batch_size):
+            batch = training_data[start : start + self.batch_size]
+            tokens, labels = self._collate(batch)
+
+            with (
+                torch.inference_mode(),
+                self._autocast(),
+                self._attention_context(),
+            ):
+                ref_logits = self.ref_forward(tokens).logits
+                ref_logp = _label_logprobs(ref_logits, labels)
+
+            rows = ref_logp.to(torch.float16).cpu()
+            for item, row in zip(batch, rows, strict=True):
+                item["ref_logp"] = row[: len(item["tokens"]) - 1].clone()
+
+        self._move_reference("cpu")
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _move_reference(self, device: str) -> None:
+        """Move the reference weights between host and device; FSDP shards stay put"""
+        if self.ref_model is None or self.fsdp:
+            return
+        torch.nn.Module.to(self.ref_model, torch.device(device))
+
+    def _length_bucketed_order(
+        self, training_data: list[TrainingExample], epoch: int
+    ) -> NDArray[np.intp]:
+        """
+        Random epoch order for this rank in which each batch draws from a narrow length range.
+
+        Examples are sorted by length and split into buckets of
+        LENGTH_BUCKET_BATCHES batches; order is shuffled within each bucket and
+        then the buckets themselves are shuffled. The shuffle is seeded from
+        ``seed`` and the epoch, so under torchrun every rank computes the same
+        order and takes its own strided shard of it. The tail is dropped so all
+        ranks run the same number of batches.
+        """
+        rng = np.random.default_rng(self.seed + epoch)
+        lengths = np.array([len(item["tokens"]) for item in training_data])
+        order = np.argsort(lengths, kind="stable")
+        bucket_size = self.batch_size * LENGTH_BUCKET_BATCHES
+        buckets = [order[i : i + bucket_size] for i in range(0, len(order), bucket_size)]
+        for bucket in buckets:
+            rng.shuffle(bucket)
+        rng.shuffle(buckets)
+        order = np.concatenate(buckets)
+        if dist.is_initialized():
+            world_size = dist.get_world_size()
+            order = order[: len(order) - len(order) % world_size][dist.get_rank() :: world_size]
+        return order
+
+    def train_step(
+        self, batch_data: list[TrainingExample], accumulation_steps: int | None = None
+    ) -> dict[str, float]:
+        """
+        Execute one GRPO training step.
+
+        ``accumulation_steps`` is the number of micro-batches in the current
+        accumulation window, defaulting to ``gradient_accumulation_steps``; the
+        loss is divided by it so a partial final window is weighted like a full one.
+        """
+        assert self.policy_forward is not None
+        accumulation_steps = accumulation_steps or self.gradient_accumulation_steps
 
-            start_idx = end
+        total_loss = 0.0
+        total_kl = 0.0
 
-        return mask
+        # Normalize scores (GRPO: relative to group mean) on device, without a host sync
+        scores = torch.tensor(
+            [item["score"] for item in batch_data], dtype=torch.float32, device=self.device
+        )
+        if scores.numel() > 1:
+            scores = scores - scores.mean()
+            std = scores.std(unbiased=False)
+            scores = scores / torch.where(std > 1e-8, std, torch.ones_like(std))
 
-    def train_step(self, batch_data: list[TrainingExample]) -> dict[str, float]:
-        """Execute one GRPO training step"""
-        assert self.model is not None
-        assert self.ref_model is not None
+        tokens, labels = self._collate(batch_data)
+        advantages = scores.view(-1, 1)
 
-        total_loss = 0.0
-        total_kl = 0.0
+        # Reference log-probs cached by _precompute_ref_logp
+        ref_logp = pad_sequence([item["ref_logp"] for item in batch_data], batch_first=True)
+        ref_logp = F.pad(ref_logp, (0, labels.size(1) - ref_logp.size(1)))
+        (ref_logp,) = self._to_device(ref_logp)
+        ref_logp = ref_logp.float()
 
-        # Prepare batch
-        tokens_list = []
-        masks_list = []
-        scores_list = []
+        with self._autocast(), self._attention_context():
+            # Forward pass - policy model
+            outputs = self.policy_forward(tokens)
+            logits = outputs.logits
 
-        for item in batch_data:
-            tokens_list.append(item["tokens"])
-            masks_list.append(item["mask"])
-            scores_list.append(item["score"])
+            # Log probabilities of the assistant tokens only
+            logp = _label_logprobs(logits, labels)
 
-        # Normalize scores (GRPO: relative to group mean)
-        scores = np.array(scores_list)
-        if len(scores) > 1:
-            scores = scores - scores.mean()
-            std = scores.std()
-            if std > 1e-8:
-                scores = scores / std
+        # GRPO loss + KL penalty (fused under torch.compile)
+        loss, kl = self.loss_fn(logp, ref_logp, labels, advantages, self.kl_coefficient)
+        total_kl = kl.item()
 
-        # Pad sequences
-        max_len = max(len(t) for t in tokens_list)
-        max_len = ((max_len - 1) // 64 + 1) * 64  # Pad to multiple of 64
-
-        for i in range(len(tokens_list)):
-            pad_len = max_len - len(tokens_list[i])
-            tokens_list[i] = np.concatenate([tokens_list[i], np.zeros(pad_len, dtype=np.int32)])
-            masks_list[i] = np.concatenate([masks_list[i], np.full(pad_len, -100, dtype=np.int32)])
-
-        # Convert to tensors
-        tokens = torch.tensor(np.stack(tokens_list)[:, :-1]).to(self.device)
-        labels = torch.tensor(np.stack(masks_list)[:, 1:]).to(self.device)
-        advantages = torch.tensor(scores, dtype=torch.float32).view(-1, 1).to(self.device)
-
-        # Forward pass - policy model
-        outputs = self.model(tokens)
-        logits = outputs.logits
-
-        # Forward pass - reference model
-        with torch.no_grad():
-            ref_outputs = self.ref_model(tokens)
-            ref_logits = ref_outputs.logits
-
-        # Calculate log probabilities
-        logp = -F.cross_entropy(
-            logits.view(-1, logits.size(-1)),
-            labels.view(-1),
-            reduction="none",
-            ignore_index=-100,
-        ).view(labels.shape)
-
-        ref_logp = -F.cross_entropy(
-            ref_logits.view(-1, ref_logits.size(-1)),
-            labels.view(-1),
-            reduction="none",
-            ignore_index=-100,
-        ).view(labels.shape)
-
-        # Mask for valid tokens
-        mask = (labels != -100).float()
-        mask_sum = mask.sum(dim=-1).clamp_min(1e-8)
-
-        # KL divergence
-        kl = ((logp - ref_logp) * mask).sum(dim=-1) / mask_sum
-        total_kl = kl.mean().item()
-
-        # GRPO loss
-        grpo_term = torch.exp(logp - logp.detach())
-        grpo_loss = (((-grpo_term * mask).sum(-1) / mask_sum) * advantages.squeeze(-1)).mean()
-
-        # KL penalty
-        kl_loss = self.kl_coefficient * kl.mean()
-
-        # Total loss
-        loss = (grpo_loss + kl_loss) / self.gradient_accumulation_steps
+        loss = loss / accumulation_steps
         loss.backward()
 
-        total_loss = loss.item() * self.gradient_accumulation_steps
+        total_loss = loss.item() * accumulation_steps
 
         return {
             "loss": total_loss,
@@ -346,41 +737,50 @@ class GRPOTrainer:
         rewards_cid: str,
         num_epochs: int = 1,
         output_dir: str = "./output",
+        cache_dir: str | None = None,
     ) -> dict:
         """Full training loop"""
         os.makedirs(output_dir, exist_ok=True)
 
         # Load data
-        training_data = self.load_training_data(trajectory_manifest_cid, rewards_cid)
+        training_data = self.load_training_data(
+            trajectory_manifest_cid, rewards_cid, cache_dir=cache_dir
+        )
 
         if not training_data:
             raise ValueError("No training data loaded")
 
+        self._precompute_ref_logp(training_data)
+
         all_metrics = []
 
         for epoch in range(num_epochs):
             logger.info(f"Epoch {epoch + 1}/{num_epochs}")
 
-            # Shuffle data
-            random.shuffle(training_data)
+            # Shuffle data, keeping similar lengths together to limit padding
+            order = self._length_bucketed_order(training_data, epoch)
 
             # Process in batches
-            num_batches = math.ceil(len(training_data) / self.batch_size)
+            num_batches = math.ceil(len(order) / self.batch_size)
 
             for batch_idx in range(num_batches):
                 start = batch_idx * self.batch_size
-                end = min(start + self.batch_size, len(training_data))
-                batch = training_data[start:end]
+                batch = [training_data[i] for i in order[start : start + self.batch_size]]
 
-                metrics = self.train_step(batch)
+                # Step on every K-th micro-batch and on the last one, so a partial
+                # accumulation window never leaks into the next epoch
+                sync_step = (batch_idx + 1) % self.gradient_accumulation_steps == 0 or (
+                    batch_idx + 1 == num_batches
+                )
+                window_start = batch_idx - batch_idx % self.gradient_accumulation_steps
+                window_len = min(self.gradient_accumulation_steps, num_batches - window_start)
+                with self._accumulation_context(sync_step):
+                    metrics = self.train_step(batch, window_len)
 
                 # Accumulate gradients
-                if (batch_idx + 1) % self.gradient_accumulation_steps == 0:
-                    assert self.model is not None, "Model not initialized"
+                if sync_step:
                     assert self.optimizer is not None, "Optimizer not initialized"
-                    grad_norm = torch.nn.utils.clip_grad_norm_(
-                        self.model.parameters(), max_norm=self.max_grad_norm
-                    )
+                    grad_norm = self._clip_grad_norm()
                     self.optimizer.step()
                     self.optimizer.zero_grad()
 
@@ -396,10 +796,19 @@ class GRPOTrainer:
         assert self.model is not None, "Model not initialized"
         assert self.tokenizer is not None, "Tokenizer not initialized"
         checkpoint_path = os.path.join(output_dir, "checkpoint")
-        self.model.save_pretrained(checkpoint_path)
-        self.tokenizer.save_pretrained(checkpoint_path)
-
-        logger.info(f"Saved checkpoint to {checkpoint_path}")
+        state_dict = None
+        if self.sharded_policy is not None:
+            # Gather the full weights onto rank 0's CPU for a standard HF checkpoint
+            with FSDP.state_dict_type(
+                self.sharded_policy,
+                StateDictType.FULL_STATE_DICT,
+                FullStateDictConfig(offload_to_cpu=True, rank0_only=True),
+            ):
+                state_dict = self.sharded_policy.state_dict()
+        if self._is_main_process():
+            self.model.save_pretrained(checkpoint_path, state_dict=state_dict)
+            self.tokenizer.save_pretrained(checkpoint_path)
+            logger.info(f"Saved checkpoint to {checkpoint_path}")
 
         # Calculate final metrics
         final_metrics = {
@@ -413,29 +822,73 @@ class GRPOTrainer:
         }
 
         # Save metrics
-        with open(os.path.join(output_dir, "metrics.json"), "w") as f:
-            json.dump(final_metrics, f, indent=2)
+        if self._is_main_process():
+            with open(os.path.join(output_dir, "metrics.json"), "w") as f:
+                json.dump(final_metrics, f, indent=2)
 
         return final_metrics
 
     def upload_checkpoint(self, output_dir: str) -> str:
         """Upload checkpoint to Jeju Storage and return CID"""
-        # Create tarball
-        import io
+        import shutil
+        import subprocess
         import tarfile
-
-        tar_buffer = io.BytesIO()
-        with tarfile.open(fileobj=tar_buffer, mode="w:gz") as tar:
-            tar.add(output_dir, arcname="checkpoint")
-
-        tar_buffer.seek(0)
-
-        # Upload to storage
-        response = requests.post(
-            f"{self.storage_url}/upload",
-            files={"file": ("checkpoint.tar.gz", tar_buffer, "application/gzip")},
+        import threading
+        import uuid
+
+        # The tarball is produced on a writer thread and streamed into the request
+        # body, so it is never held in memory. pigz, when present, does the gzip.
+        pigz = (
+            subprocess.Popen(["pigz", "-c"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            if shutil.which("pigz")
+            else None
         )
-
+        if pigz is not None:
+            assert pigz.stdin is not None and pigz.stdout is not None
+            sink, source, tar_mode = pigz.stdin, pigz.stdout, "w|"
+        else:
+            read_fd, write_fd = os.pipe()
+            sink, source, tar_mode = os.fdopen(write_fd, "wb"), os.fdopen(read_fd, "rb"), "w|gz"
+
+        tar_errors: list[BaseException] = []
+
+        def write_tarball() -> None:
+            try:
+                with sink, tarfile.open(fileobj=sink, mode=tar_mode) as tar:
+                    tar.add(output_dir, arcname="checkpoint")
+            except BaseException as e:
+                tar_errors.append(e)
+
+        boundary = uuid.uuid4().hex
+
+        def multipart_body():
+            yield (
+                f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="file"; filename="checkpoint.tar.gz"\r\n'
+                "Content-Type: application/gzip\r\n\r\n"
+            ).encode()
+            while chunk := source.read(1 << 20):
+                yield chunk
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        writer = threading.Thread(target=write_tarball, daemon=True)
+        writer.start()
+        try:
+            # Upload to storage
+            response = self._session.post(
+                f"{self.storage_url}/upload",
+                data=multipart_body(),
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            )
+        finally:
+            # Unblocks the writer if the request bailed out before draining the pipe
+            source.close()
+            writer.join()
+            if pigz is not None and pigz.wait() != 0 and not tar_errors:
+                tar_errors.append(RuntimeError(f"pigz exited {pigz.returncode}"))
+
+        if tar_errors:
+            raise RuntimeError(f"Failed to create checkpoint tarball: {tar_errors[0]}")
         if not response.ok:
             raise RuntimeError(f"Failed to upload checkpoint: {response.status_code}")
 
@@ -444,24 +897,63 @@ class GRPOTrainer:
 
     def _fetch_from_storage(self, cid: str) -> dict:
         """Fetch JSON data from Jeju Storage"""
-        response = requests.get(f"{self.storage_url}/get/{cid}")
+        response = self._session.get(f"{self.storage_url}/get/{cid}")
         if not response.ok:
             raise RuntimeError(f"Failed to fetch {cid}: {response.status_code}")
         return response.json()
 
+    def _fetch_many(self, cids: list[str]) -> list[dict]:
+        """Fetch JSON documents concurrently over the pooled session, in input order"""
+        if not cids:
+            return []
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(cids))) as pool:
+            return list(pool.map(self._fetch_from_storage, cids))
+
     def _download_model(self, cid: str) -> str:
         """Download model from Jeju Storage"""
+        import shutil
+        import subprocess
         import tarfile
         import tempfile
 
-        response = requests.get(f"{self.storage_url}/get/{cid}", stream=True)
+        response = self._session.get(f"{self.storage_url}/get/{cid}", stream=True)
         if not response.ok:
             raise RuntimeError(f"Failed to download model {cid}: {response.status_code}")
 
-        # Extract to temp directory
+        # Extract to temp directory while the download streams in
         temp_dir = tempfile.mkdtemp()
-        with tarfile.open(fileobj=response.raw, mode="r:gz") as tar:
-            tar.extractall(temp_dir)
+        try:
+            if shutil.which("pigz") and shutil.which("tar"):
+                # Multi-threaded gunzip via pigz
+                proc = subprocess.Popen(
+                    ["tar", "-I", "pigz", "-xf", "-", "-C", temp_dir], stdin=subprocess.PIPE
+                )
+                assert proc.stdin is not None
+                try:
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        proc.stdin.write(chunk)
+                except BrokenPipeError:
+                    pass  # tar exited early; reported by the return code below
+                except BaseException:
+                    # Download failed mid-stream; don't leave tar waiting on stdin
+                    proc.kill()
+                    proc.wait()
+                    raise
+                finally:
+                    # Flushing the pipe fails the same way if tar is already gone
+                    with contextlib.suppress(BrokenPipeError):
+                        proc.stdin.close()
+                if proc.wait() != 0:
+                    raise RuntimeError(
+                        f"Failed to extract model {cid}: tar exited {proc.returncode}"
+                    )
+            else:
+                response.raw.decode_content = True
+                with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+                    tar.extractall(temp_dir)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
 
         return os.path.join(temp_dir, "checkpoint")
 
@@ -474,11 +966,29 @@ def main():
     parser.add_argument("--reference-model", help="Reference model CID (optional)")
     parser.add_argument("--storage-url", default="http://localhost:4010", help="Jeju Storage URL")
     parser.add_argument("--output", default="./output", help="Output directory")
+    parser.add_argument(
+        "--cache-dir", help="Directory for memory-mapped tokenized trajectories (optional)"
+    )
     parser.add_argument("--epochs", type=int, default=1, help="Number of epochs")
     parser.add_argument("--batch-size", type=int, default=4, help="Batch size")
     parser.add_argument("--lr", type=float, default=1e-5, help="Learning rate")
     parser.add_argument("--kl-coeff", type=float, default=0.1, help="KL coefficient")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the epoch shuffle")
     parser.add_argument("--upload", action="store_true", help="Upload checkpoint to storage")
+    parser.add_argument(
+        "--optim",
+        choices=["adamw", "adamw8bit"],
+        default="adamw",
+        help="Optimizer (adamw8bit requires bitsandbytes)",
+    )
+    parser.add_argument(
+        "--fsdp",
+        action="store_true",
+        help="Shard policy and reference models with FSDP (launch with torchrun)",
+    )
+    parser.add_argument(
+        "--no-compile", action="store_true", help="Disable torch.compile on the forward passes"
+    )
 
     args = parser.parse_args()
 
@@ -488,6 +998,10 @@ def main():
         learning_rate=args.lr,
         batch_size=args.batch_size,
         kl_coefficient=args.kl_coeff,
+        compile_model=not args.no_compile,
+        optimizer=args.optim,
+        fsdp=args.fsdp,
+        seed=args.seed,
     )
 
     trainer.setup(reference_model_cid=args.reference_model)
@@ -497,11 +1011,12 @@ def main():
         rewards_cid=args.rewards,
         num_epochs=args.epochs,
         output_dir=args.output,
+        cache_dir=args.cache_dir,
     )
 
     print(json.dumps(metrics, indent=2))
 
-    if args.upload:
+    if args.upload and trainer._is_main_process():
         cid = trainer.upload_checkpoint(args.output)
         print(f"Uploaded checkpoint: {cid}")
 
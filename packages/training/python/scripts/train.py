@@ -33,34 +33,53 @@ Model recommendations for consumer hardware:
 
 import argparse
 import asyncio
+import bisect
+import contextlib
+import functools
+import hashlib
 import json
 import logging
 import os
+import queue
 import random
+import shutil
 import subprocess
 import sys
+import threading
 from pathlib import Path
-from typing import Literal, Protocol, TypedDict, cast
+from typing import TYPE_CHECKING, Any, Literal, Protocol, TypedDict, cast
 
 # Add src to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from dotenv import load_dotenv
-from src.data_bridge.reader import (
-    JsonTrajectoryReader,
-    PostgresTrajectoryReader,
-    validate_llm_calls,
-)
-from src.models import JejuTrajectory
+
+# Data readers and training backends are imported where they are used, so that
+# --help and argument errors don't wait on pydantic, numpy or torch
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from datasets import Dataset
+    from src.models import JejuTrajectory
 
 # Load environment
-env_path = Path(__file__).parent.parent.parent.parent.parent / ".env"
+# scripts/ -> python/ -> training/ -> packages/ -> repo root
+REPO_ROOT = Path(__file__).resolve().parents[4]
+env_path = REPO_ROOT / ".env"
 if env_path.exists():
     load_dotenv(env_path)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
+# Upper bound on characters per token, for discarding over-long samples early
+_MAX_CHARS_PER_TOKEN = 8
+
+# Below this many trajectories, starting worker processes costs more than the
+# parallel JSON decoding/validation or sample building saves
+JSON_PARALLEL_MIN_TRAJECTORIES = 500
+SAMPLES_PARALLEL_MIN_TRAJECTORIES = 2000
+
 
 class TrainingMessage(TypedDict):
     role: str
@@ -109,8 +128,19 @@ async def load_postgres_data(
     min_actions: int,
     lookback_hours: int,
     max_trajectories: int,
-) -> list[JejuTrajectory]:
-    """Load training data from PostgreSQL database."""
+    cache_dir: str | None = None,
+) -> "list[JejuTrajectory]":
+    """
+    Load training data from PostgreSQL database.
+
+    With ``cache_dir`` the decoded trajectories are saved as JSON lines keyed
+    on the window list, the filters and a row-count/newest-row fingerprint of
+    those windows. A rerun against unchanged windows then costs two small
+    queries instead of a fetch per window; new rows invalidate the entry.
+    """
+    from src.data_bridge.reader import PostgresTrajectoryReader, json_loads, validate_llm_calls
+    from src.models import JejuTrajectory
+
     logger.info("Loading training data from database...")
 
     trajectories: list[JejuTrajectory] = []
@@ -122,15 +152,36 @@ async def load_postgres_data(
 
         logger.info(f"Found {len(windows)} trajectory windows")
 
-        for window_id in windows:
-            if len(trajectories) >= max_trajectories:
-                break
-
-            window_trajectories = await reader.get_trajectories_by_window(
-                window_id, min_actions=min_actions, validate=True
-            )
-            for traj_row in window_trajectories:
-                steps = json.loads(traj_row.steps_json)
+        cache_path = None
+        if cache_dir:
+            fingerprint = await reader.get_windows_fingerprint(windows)
+            key = hashlib.sha256(
+                json.dumps([windows, fingerprint, min_actions, max_trajectories]).encode()
+            ).hexdigest()[:16]
+            cache_path = Path(cache_dir) / f"trajectories_{key}.jsonl"
+            if cache_path.exists():
+                with open(cache_path, "rb") as f:
+                    trajectories = [JejuTrajectory.model_validate_json(line) for line in f]
+                logger.info(f"Loaded {len(trajectories)} trajectories from cache: {cache_path}")
+                return trajectories
+
+        # One streamed query over all windows (newest first); leaving the loop
+        # closes the server-side cursor, so unused rows are never transferred
+        # The LLM-call check runs here rather than in the reader, so each
+        # stepsJson blob is decoded once and the result reused for validation
+        stream = reader.iter_trajectories(windows, min_actions=min_actions, validate=False)
+        try:
+            async for traj_row in stream:
+                try:
+                    steps = json_loads(traj_row.steps_json)
+                except (ValueError, TypeError):
+                    logger.warning(
+                        f"Could not parse steps_json for trajectory {traj_row.trajectory_id}"
+                    )
+                    continue
+                is_valid, _ = validate_llm_calls(steps, collect_issues=False)
+                if not is_valid:
+                    continue
                 traj_data = {
                     "id": traj_row.trajectory_id,
                     "trajectory_id": traj_row.trajectory_id,
@@ -145,41 +196,96 @@ async def load_postgres_data(
                     "archetype": traj_row.archetype,
                 }
                 trajectories.append(JejuTrajectory.model_validate(traj_data))
+                if len(trajectories) >= max_trajectories:
+                    break
+        finally:
+            await stream.aclose()
 
     if len(trajectories) < 10:
         raise ValueError(
             f"Insufficient training data: only {len(trajectories)} valid trajectories found."
         )
 
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for traj in trajectories:
+                f.write(traj.model_dump_json() + "\n")
+        tmp_path.replace(cache_path)
+        logger.info(f"Cached trajectories: {cache_path}")
+
     logger.info(f"Loaded {len(trajectories)} trajectories from database")
     return trajectories
 
 
-def load_json_data(source_dir: str, max_trajectories: int) -> list[JejuTrajectory]:
-    """Load training data from local JSON files."""
+def _parse_json_window(window: list[dict], limit: int) -> "list[JejuTrajectory]":
+    """Decode, filter and validate up to ``limit`` trajectories from one window."""
+    from src.data_bridge.reader import json_loads, validate_llm_calls
+    from src.models import JejuTrajectory
+
+    trajectories: list[JejuTrajectory] = []
+    for traj_data in window:
+        # Stop before decoding steps we won't use
+        if len(trajectories) >= limit:
+            break
+        # Handle nested trajectory key and stepsJson string format
+        if "trajectory" in traj_data:
+            traj_data = traj_data["trajectory"]
+        if "stepsJson" in traj_data and isinstance(traj_data["stepsJson"], str):
+            traj_data["steps"] = json_loads(traj_data["stepsJson"])
+
+        is_valid, _ = validate_llm_calls(traj_data.get("steps", []), collect_issues=False)
+        if not is_valid:
+            continue
+
+        if "id" not in traj_data:
+            traj_data["id"] = traj_data.get("trajectory_id", "id_missing")
+
+        trajectories.append(JejuTrajectory.model_validate(traj_data))
+    return trajectories
+
+
+def load_json_data(source_dir: str, max_trajectories: int) -> "list[JejuTrajectory]":
+    """
+    Load training data from local JSON files.
+
+    Large directories are decoded and validated one window per worker process;
+    results are still taken in window order and capped at ``max_trajectories``.
+    """
+    from src.data_bridge.reader import JsonTrajectoryReader
+
     logger.info(f"Loading training data from: {source_dir}")
 
     reader = JsonTrajectoryReader(source_dir)
+    windows = [reader.get_trajectories_by_window(w) for w in reader.get_window_ids()]
     trajectories: list[JejuTrajectory] = []
 
-    for window_id in reader.get_window_ids():
-        if len(trajectories) >= max_trajectories:
-            break
-        for traj_data in reader.get_trajectories_by_window(window_id):
-            # Handle nested trajectory key and stepsJson string format
-            if "trajectory" in traj_data:
-                traj_data = traj_data["trajectory"]
-            if "stepsJson" in traj_data and isinstance(traj_data["stepsJson"], str):
-                traj_data["steps"] = json.loads(traj_data["stepsJson"])
-
-            is_valid, _ = validate_llm_calls(traj_data.get("steps", []))
-            if not is_valid:
-                continue
-
-            if "id" not in traj_data:
-                traj_data["id"] = traj_data.get("trajectory_id", "id_missing")
+    workers = min(os.cpu_count() or 1, len(windows))
+    total = sum(len(window) for window in windows)
+    if workers < 2 or min(total, max_trajectories) < JSON_PARALLEL_MIN_TRAJECTORIES:
+        for window in windows:
+            if len(trajectories) >= max_trajectories:
+                break
+            trajectories.extend(_parse_json_window(window, max_trajectories - len(trajectories)))
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
 
-            trajectories.append(JejuTrajectory.model_validate(traj_data))
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            futures = [
+                executor.submit(_parse_json_window, window, max_trajectories) for window in windows
+            ]
+            for future in futures:
+                trajectories.extend(future.result())
+                if len(trajectories) >= max_trajectories:
+                    break
+        finally:
+            executor.shutdown(cancel_futures=True)
+        del trajectories[max_trajectories:]
 
     if len(trajectories) == 0:
         raise ValueError("No valid trajectories found in JSON files.")
@@ -188,75 +294,148 @@ def load_json_data(source_dir: str, max_trajectories: int) -> list[JejuTrajector
     return trajectories
 
 
+def _read_csv_columns(
+    csv_path: str, columns: tuple[str, ...], min_present: int
+) -> dict[str, list[str | None]]:
+    """
+    Read chat text columns from the high-quality rows (score > 0.7) of a CSV.
+
+    Blank and non-string values come back as None, and rows with fewer than
+    ``min_present`` non-empty columns are dropped. Only the text columns and
+    ``score`` are parsed. The filtering runs as vectorized pyarrow kernels when
+    available, pandas string ops otherwise.
+    """
+    wanted = (*columns, "score")
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        import pandas as pd
+
+        df = pd.read_csv(csv_path, usecols=lambda col: col in wanted)
+        if "score" in df.columns:
+            # Row selection already yields a new frame; project instead of copying it
+            df = df.loc[df["score"] > 0.7, [col for col in columns if col in df.columns]]
+            logger.info(f"Filtered to {len(df)} high-quality samples")
+        frame = pd.DataFrame(index=df.index)
+        for col in columns:
+            if col in df.columns and pd.api.types.is_string_dtype(df[col]):
+                values = df[col].where(df[col].str.strip().str.len() > 0)
+                frame[col] = values.astype(object).where(values.notna(), None)
+        frame = frame[frame.notna().sum(axis=1) >= min_present]
+        return {col: frame[col].tolist() for col in frame.columns}
+
+    table = pa_csv.read_csv(
+        csv_path,
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(wanted), include_missing_columns=True
+        ),
+    )
+    # Columns missing from the file come back as all-null placeholders
+    if not pa.types.is_null(table["score"].type):
+        table = table.filter(pc.greater(table["score"], 0.7))
+        logger.info(f"Filtered to {table.num_rows} high-quality samples")
+
+    texts: dict[str, pa.ChunkedArray] = {}
+    for col in columns:
+        if col in table.column_names and pa.types.is_string(table[col].type):
+            values = table[col]
+            blank = pc.equal(pc.utf8_trim_whitespace(values), "")
+            texts[col] = pc.if_else(blank, pa.scalar(None, pa.string()), values)
+    present = pa.array([0] * table.num_rows, pa.int64())
+    for values in texts.values():
+        present = pc.add(present, pc.cast(pc.is_valid(values), pa.int64()))
+    keep = pc.greater_equal(present, min_present)
+    return {col: values.filter(keep).to_pylist() for col, values in texts.items()}
+
+
 def load_csv_data(csv_path: str) -> list[TrainingSample]:
     """Load pre-processed training data from CSV."""
-    import pandas as pd
-
     logger.info(f"Loading training data from CSV: {csv_path}")
-    df = pd.read_csv(csv_path)
+    roles = {"system": "system", "prompt": "user", "response": "assistant"}
+    columns = _read_csv_columns(csv_path, tuple(roles), min_present=2)
 
-    # Filter for high quality data
-    if "score" in df.columns:
-        df = df[df["score"] > 0.7].copy()
-        logger.info(f"Filtered to {len(df)} high-quality samples")
+    samples: list[TrainingSample] = []
+    for row in zip(*columns.values(), strict=True):
+        messages: list[TrainingMessage] = [
+            {"role": roles[col], "content": content}
+            for col, content in zip(columns, row, strict=True)
+            if content is not None
+        ]
+        samples.append({"messages": messages})
 
-    def get_nonempty_str(record: dict[str, object], key: str) -> str | None:
-        value = record.get(key)
-        if isinstance(value, str) and value.strip():
-            return value
-        return None
+    logger.info(f"Loaded {len(samples)} training samples from CSV")
+    return samples
 
-    columns = [str(col) for col in df.columns]
 
+def _traj_to_samples(calls: list[tuple[str, str, str]]) -> list[TrainingSample]:
+    """Build chat samples from one trajectory's (system, user, response) LLM call texts."""
     samples: list[TrainingSample] = []
-    for row_values in df.itertuples(index=False, name=None):
-        record: dict[str, object] = dict(zip(columns, row_values, strict=True))
-        messages: list[TrainingMessage] = []
-
-        system = get_nonempty_str(record, "system")
-        if system is not None:
-            messages.append({"role": "system", "content": system})
+    for system_prompt, user_prompt, response in calls:
+        if not response or len(response) < 20:
+            continue
 
-        prompt = get_nonempty_str(record, "prompt")
-        if prompt is not None:
-            messages.append({"role": "user", "content": prompt})
-
-        response = get_nonempty_str(record, "response")
-        if response is not None:
-            messages.append({"role": "assistant", "content": response})
+        messages: list[TrainingMessage] = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        if user_prompt:
+            messages.append({"role": "user", "content": user_prompt})
+        messages.append({"role": "assistant", "content": response})
 
         if len(messages) >= 2:
             samples.append({"messages": messages})
-
-    logger.info(f"Loaded {len(samples)} training samples from CSV")
     return samples
 
 
-def trajectories_to_samples(trajectories: list[JejuTrajectory]) -> list[TrainingSample]:
-    """Convert trajectories to training samples."""
+def trajectories_to_samples(trajectories: "list[JejuTrajectory]") -> list[TrainingSample]:
+    """
+    Convert trajectories to training samples.
+
+    Large inputs are converted across worker processes, which only receive the
+    LLM call texts; samples keep trajectory order either way.
+    """
+    calls = (
+        [
+            (llm_call.system_prompt, llm_call.user_prompt, llm_call.response)
+            for step in traj.steps
+            for llm_call in step.llm_calls
+        ]
+        for traj in trajectories
+    )
     samples: list[TrainingSample] = []
-    for traj in trajectories:
-        for step in traj.steps:
-            if not step.llm_calls:
-                continue
-            for llm_call in step.llm_calls:
-                if not llm_call.response or len(llm_call.response) < 20:
-                    continue
 
-                messages: list[TrainingMessage] = []
-                if llm_call.system_prompt:
-                    messages.append({"role": "system", "content": llm_call.system_prompt})
-                if llm_call.user_prompt:
-                    messages.append({"role": "user", "content": llm_call.user_prompt})
-                messages.append({"role": "assistant", "content": llm_call.response})
+    workers = os.cpu_count() or 1
+    if workers < 2 or len(trajectories) < SAMPLES_PARALLEL_MIN_TRAJECTORIES:
+        for traj_calls in calls:
+            samples.extend(_traj_to_samples(traj_calls))
+    else:
+        import multiprocessing
 
-                if len(messages) >= 2:
-                    samples.append({"messages": messages})
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            for chunk in pool.imap(_traj_to_samples, calls, chunksize=32):
+                samples.extend(chunk)
 
     logger.info(f"Converted {len(trajectories)} trajectories to {len(samples)} training samples")
     return samples
 
 
+def _write_jsonl(path: str, rows: list[TrainingSample]) -> None:
+    """Write ``rows`` as JSON lines through a 1 MiB buffer, with orjson if available."""
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    with open(path, "wb", buffering=1 << 20) as f:
+        if orjson is not None:
+            for row in rows:
+                f.write(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE))
+        else:
+            for row in rows:
+                f.write((json.dumps(row) + "\n").encode())
+
+
 def train_mlx(
     samples: list[TrainingSample],
     model_name: str,
@@ -264,6 +443,7 @@ def train_mlx(
     num_iters: int,
     batch_size: int,
     learning_rate: float,
+    seed: int = 42,
 ) -> str:
     """Train using MLX LoRA on Apple Silicon."""
     logger.info("=" * 60)
@@ -273,16 +453,15 @@ def train_mlx(
     data_dir = os.path.join(output_dir, "training_data")
     os.makedirs(data_dir, exist_ok=True)
 
-    random.shuffle(samples)
-    split_idx = int(len(samples) * 0.9)
-    train_samples, valid_samples = samples[:split_idx], samples[split_idx:]
+    # Seeded 90/10 split: only the validation indices are drawn, and the same
+    # samples give the same split on every run (mlx_lm shuffles batches itself)
+    n = len(samples)
+    valid_idx = set(random.Random(seed).sample(range(n), n - int(n * 0.9)))
+    train_samples = [s for i, s in enumerate(samples) if i not in valid_idx]
+    valid_samples = [s for i, s in enumerate(samples) if i in valid_idx]
 
-    with open(os.path.join(data_dir, "train.jsonl"), "w") as f:
-        for s in train_samples:
-            f.write(json.dumps(s) + "\n")
-    with open(os.path.join(data_dir, "valid.jsonl"), "w") as f:
-        for s in valid_samples:
-            f.write(json.dumps(s) + "\n")
+    _write_jsonl(os.path.join(data_dir, "train.jsonl"), train_samples)
+    _write_jsonl(os.path.join(data_dir, "valid.jsonl"), valid_samples)
 
     adapter_path = os.path.join(output_dir, "adapters")
 
@@ -323,6 +502,288 @@ def train_mlx(
     return adapter_path
 
 
+def tokenize_samples(
+    samples: list[TrainingSample],
+    tokenizer: Any,
+    model_name: str,
+    output_dir: str,
+    max_length: int = 1024,
+    pack: bool = False,
+) -> "Dataset":
+    """
+    Chat-format and tokenize samples once, caching the result on disk.
+
+    The cache lives under ``output_dir/.tok_cache/<hash>`` keyed on the model,
+    max length, packing and sample contents, so reruns on the same data skip
+    tokenization and packing and memory-map the saved Arrow files instead.
+    Sequences are left unpadded; the collator pads each batch dynamically.
+    Samples longer than ``max_length`` tokens are dropped rather than truncated.
+    """
+    from datasets import Dataset, Features, Value, load_from_disk
+
+    key = hashlib.sha256(
+        json.dumps([model_name, max_length, pack, "drop-long", samples], sort_keys=True).encode()
+    ).hexdigest()[:16]
+    cache_path = os.path.join(output_dir, ".tok_cache", key)
+    if os.path.isdir(cache_path):
+        logger.info(f"Loading tokenized dataset from cache: {cache_path}")
+        return cast(Dataset, load_from_disk(cache_path))
+
+    # No token spans more than a few characters, so text this long can't fit;
+    # skip it before paying for tokenization
+    max_chars = max_length * _MAX_CHARS_PER_TOKEN
+
+    # Trajectory data repeats whole conversations often enough that skipping
+    # the Jinja render for recent duplicates is worth a bounded cache
+    @functools.lru_cache(maxsize=4096)
+    def render(messages: tuple[tuple[str, str], ...]) -> str:
+        return tokenizer.apply_chat_template(
+            [{"role": role, "content": content} for role, content in messages],
+            tokenize=False,
+            add_generation_prompt=False,
+        )
+
+    def chat_texts() -> "Iterator[dict[str, str]]":
+        for s in samples:
+            if not s.get("messages"):
+                continue
+            text = render(tuple((m["role"], m["content"]) for m in s["messages"]))
+            if len(text) <= max_chars:
+                yield {"text": text}
+
+    # Stream the chat texts straight into Arrow files next to the cache, so
+    # neither they nor the tokenized columns are ever held in memory at once
+    build_dir = f"{cache_path}.build"
+    dataset = Dataset.from_generator(
+        chat_texts,
+        features=Features({"text": Value("string")}),
+        cache_dir=build_dir,
+        fingerprint=key,
+    )
+    num_texts = len(dataset)
+
+    def tokenize_fn(examples: dict) -> dict:
+        # One token past the limit is enough to tell which samples don't fit
+        return tokenizer(
+            examples["text"],
+            truncation=True,
+            max_length=max_length + 1,
+            padding=False,
+        )
+
+    if getattr(tokenizer, "is_fast", False):
+        # The Rust tokenizer spreads large batches over all cores itself, so one
+        # process avoids pickling the tokenizer into every worker
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
+        num_proc, batch_size = None, 10_000
+    else:
+        # Worker processes only pay off once there is enough text to split up
+        num_proc = os.cpu_count() if num_texts >= 1000 else None
+        batch_size = 1000
+    tokenized = dataset.map(
+        tokenize_fn,
+        batched=True,
+        batch_size=batch_size,
+        num_proc=num_proc,
+        remove_columns=["text"],
+    )
+    # Truncated samples would train on cut-off conversations, so drop them
+    tokenized = tokenized.filter(
+        lambda batch: [len(ids) <= max_length for ids in batch["input_ids"]],
+        batched=True,
+        batch_size=batch_size,
+    )
+    logger.info(
+        f"Kept {len(tokenized)}/{len(samples)} samples within {max_length} tokens "
+        f"({len(samples) - num_texts} skipped before tokenizing)"
+    )
+    if pack:
+        tokenized = pack_sequences(tokenized, max_length)
+    tokenized.save_to_disk(cache_path)
+    logger.info(f"Cached tokenized dataset: {cache_path}")
+
+    # Reopen from the cache so the intermediate build files can go
+    del dataset, tokenized
+    shutil.rmtree(build_dir, ignore_errors=True)
+    return cast(Dataset, load_from_disk(cache_path))
+
+
+def pack_sequences(dataset: "Dataset", max_length: int = 1024) -> "Dataset":
+    """
+    Pack tokenized sequences into rows of at most ``max_length`` tokens.
+
+    Best-fit decreasing: sequences are placed longest first, each into the row
+    with the least room that still fits it. ``position_ids`` restart at 0 for
+    every packed sequence, which FlashAttention-2 uses to keep them separate.
+    """
+    from datasets import Dataset
+
+    input_ids: list[list[int]] = dataset["input_ids"]
+    order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]), reverse=True)
+
+    rows: list[list[int]] = []
+    free: list[tuple[int, int]] = []  # (remaining capacity, row), kept sorted
+    for idx in order:
+        length = len(input_ids[idx])
+        pos = bisect.bisect_left(free, (length, -1))
+        if pos < len(free):
+            remaining, row = free.pop(pos)
+        else:
+            remaining, row = max_length, len(rows)
+            rows.append([])
+        rows[row].append(idx)
+        if remaining > length:
+            bisect.insort(free, (remaining - length, row))
+
+    packed: dict[str, list[list[int]]] = {"input_ids": [], "position_ids": []}
+    for row_indices in rows:
+        packed["input_ids"].append([tok for i in row_indices for tok in input_ids[i]])
+        packed["position_ids"].append([p for i in row_indices for p in range(len(input_ids[i]))])
+
+    logger.info(f"Packed {len(input_ids)} sequences into {len(rows)} rows of <= {max_length}")
+    return Dataset.from_dict(packed)
+
+
+class PackedBatchCollator:
+    """
+    Right-pad packed rows into a batch.
+
+    Labels mask padding and the first token of each packed sequence, so no
+    sequence is trained to predict the start of the next one. Widths are
+    rounded up to a multiple of 8 for tensor cores; with ``max_length`` every
+    batch is padded to that width, keeping shapes static for a compiled model.
+    """
+
+    def __init__(self, pad_token_id: int, max_length: int | None = None):
+        self.pad_token_id = pad_token_id
+        self.max_length = max_length
+
+    def __call__(self, features: list[dict[str, list[int]]]) -> dict[str, Any]:
+        import numpy as np
+        import torch
+
+        width = self.max_length or -(-max(len(f["input_ids"]) for f in features) // 8) * 8
+        ids = np.full((len(features), width), self.pad_token_id, dtype=np.int64)
+        pos = np.zeros((len(features), width), dtype=np.int64)
+        for i, f in enumerate(features):
+            ids[i, : len(f["input_ids"])] = f["input_ids"]
+            pos[i, : len(f["position_ids"])] = f["position_ids"]
+
+        # Padding keeps position 0, so one mask covers padding and sequence starts
+        labels = np.where(pos == 0, -100, ids)
+        return {
+            "input_ids": torch.from_numpy(ids),
+            "position_ids": torch.from_numpy(pos),
+            "labels": torch.from_numpy(labels),
+        }
+
+
+class DataPrefetcher:
+    """
+    Iterate a dataloader from a background thread.
+
+    Up to ``depth`` batches are fetched (collated, pinned and copied to the
+    device) while the training step runs. On CUDA the copies are issued on a
+    side stream with ``non_blocking=True``, and the consumer's stream waits on
+    a per-batch event before the batch is used. Any other attribute is
+    looked up on the wrapped loader, so the Trainer still sees its sampler,
+    length and ``set_epoch``.
+    """
+
+    _DONE = object()
+
+    def __init__(self, loader: Any, depth: int = 2, device: Any = None):
+        import torch
+
+        self.loader = loader
+        self.depth = depth
+        self.device = torch.device(device) if device is not None else None
+        self.copy_stream = (
+            torch.cuda.Stream(device=self.device)
+            if self.device is not None and self.device.type == "cuda"
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.loader, name)
+
+    def _to_device(self, value: Any) -> Any:
+        """Pin a CPU tensor and start its copy to the target device."""
+        import torch
+
+        if not isinstance(value, torch.Tensor) or value.device.type != "cpu":
+            return value
+        if torch.cuda.is_available() and not value.is_pinned():
+            value = value.pin_memory()
+        if self.device is None:
+            return value
+        return value.to(self.device, non_blocking=True)
+
+    def __iter__(self):
+        import torch
+
+        batches: queue.Queue = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+
+        def put(item: object) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            # The prepared loader's own device copy also lands on the side stream
+            stream_ctx = (
+                torch.cuda.stream(self.copy_stream)
+                if self.copy_stream is not None
+                else contextlib.nullcontext()
+            )
+            try:
+                with stream_ctx:
+                    for batch in self.loader:
+                        if isinstance(batch, dict):
+                            batch = {k: self._to_device(v) for k, v in batch.items()}
+                        event = None
+                        if self.copy_stream is not None:
+                            event = torch.cuda.Event()
+                            event.record(self.copy_stream)
+                        if not put((batch, event)):
+                            return
+            except BaseException as e:
+                put(e)
+            else:
+                put(self._DONE)
+
+        worker = threading.Thread(target=produce, daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                batch, event = item
+                if event is not None:
+                    current = torch.cuda.current_stream(self.device)
+                    current.wait_event(event)
+                    if isinstance(batch, dict):
+                        # Memory allocated on the side stream is now used on this one
+                        for v in batch.values():
+                            if isinstance(v, torch.Tensor) and v.is_cuda:
+                                v.record_stream(current)
+                yield batch
+        finally:
+            stop.set()
+            worker.join()
+
+
 def train_cuda(
     samples: list[TrainingSample],
     model_name: str,
@@ -331,10 +792,11 @@ def train_cuda(
     batch_size: int,
     learning_rate: float,
     use_lora: bool,
+    packing: bool = True,
 ) -> str:
     """Train using PyTorch/CUDA on NVIDIA GPU."""
     import torch
-    from datasets import Dataset
+    from src.training.attention import attn_implementation as select_attn_implementation
     from transformers import (
         AutoModelForCausalLM,
         AutoTokenizer,
@@ -346,70 +808,153 @@ def train_cuda(
     logger.info("=" * 60)
     logger.info("CUDA/PYTORCH TRAINING")
     logger.info("=" * 60)
-    logger.info(f"VRAM: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
+    if torch.cuda.is_available():
+        logger.info(f"VRAM: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
 
-    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True, trust_remote_code=True)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
 
-    formatted = [
-        {
-            "text": tokenizer.apply_chat_template(
-                s["messages"], tokenize=False, add_generation_prompt=False
-            )
-        }
-        for s in samples
-        if s.get("messages")
-    ]
-    dataset = Dataset.from_list(formatted)
-
-    def tokenize_fn(examples: dict) -> dict:
-        return tokenizer(
-            examples["text"],
-            truncation=True,
-            max_length=1024,
-            padding="max_length",
+    # bf16 has fp32's exponent range, so no loss scaling and no fp16 overflow NaNs
+    on_cuda = torch.cuda.is_available()
+    use_bf16 = on_cuda and torch.cuda.is_bf16_supported()
+    # Ampere and newer run the remaining fp32 matmuls (fp32 LoRA adapters,
+    # optimizer math) on TF32 tensor cores
+    use_tf32 = on_cuda and torch.cuda.get_device_capability()[0] >= 8
+    if use_tf32:
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+    attn_implementation = select_attn_implementation("cuda" if on_cuda else "cpu")
+    model_kwargs = {
+        "torch_dtype": torch.bfloat16 if use_bf16 else torch.float16,
+        "trust_remote_code": True,
+        "device_map": "auto",
+        "low_cpu_mem_usage": True,
+        "use_cache": False,
+    }
+    try:
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name, attn_implementation=attn_implementation, **model_kwargs
+        )
+    except (ImportError, ValueError) as e:
+        logger.warning(f"{attn_implementation} unavailable ({e}), falling back to sdpa")
+        attn_implementation = "sdpa"
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name, attn_implementation=attn_implementation, **model_kwargs
         )
+    logger.info(f"Attention implementation: {attn_implementation}")
+
+    # Packed batches carry no attention mask. Only FlashAttention-2 in the
+    # transformers-native model classes splits them at the position_ids resets;
+    # anywhere else packed samples would attend to each other.
+    if packing and not (
+        attn_implementation == "flash_attention_2"
+        and type(model).__module__.startswith("transformers.")
+    ):
+        logger.warning(
+            "Sequence packing needs flash_attention_2 on a natively supported model; "
+            "training on unpacked samples"
+        )
+        packing = False
 
-    tokenized = dataset.map(tokenize_fn, batched=True, remove_columns=["text"])
+    max_length = 1024
+    tokenized = tokenize_samples(
+        samples, tokenizer, model_name, output_dir, max_length, pack=packing
+    )
 
-    model = AutoModelForCausalLM.from_pretrained(
-        model_name, torch_dtype=torch.float16, trust_remote_code=True, device_map="auto"
+    # Inductor kernels and CUDA graphs; packed batches have one fixed shape, so
+    # compiling once covers the whole run
+    use_compile = (
+        on_cuda and packing and tuple(int(v) for v in torch.__version__.split(".")[:2]) >= (2, 1)
     )
+    if use_compile:
+        # Reuse compiled kernels across runs
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(Path(output_dir) / ".inductor_cache"))
+
+    # Recompute activations in backward instead of storing them
+    model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
 
     if use_lora:
         from peft import LoraConfig, TaskType, get_peft_model
 
+        # The frozen base emits no grads, so checkpointed blocks need grad-requiring inputs
+        model.enable_input_require_grads()
+
         lora_config = LoraConfig(
             task_type=TaskType.CAUSAL_LM,
             r=16,
             lora_alpha=32,
             lora_dropout=0.1,
-            target_modules=["q_proj", "v_proj", "k_proj", "o_proj"],
+            # All attention and MLP projections; rsLoRA scales by alpha/sqrt(r)
+            target_modules=[
+                "q_proj",
+                "k_proj",
+                "v_proj",
+                "o_proj",
+                "gate_proj",
+                "up_proj",
+                "down_proj",
+            ],
+            use_rslora=True,
         )
         model = get_peft_model(model, lora_config)
+        # Base stays in bf16/fp16; the small adapters train in fp32 for range
+        for param in model.parameters():
+            if param.requires_grad:
+                param.data = param.data.float()
         model.print_trainable_parameters()
 
     training_args = TrainingArguments(
         output_dir=output_dir,
         num_train_epochs=epochs,
-        per_device_train_batch_size=1,
-        gradient_accumulation_steps=8,
+        # Same effective batch of 8; checkpointing leaves room for 4 per step
+        per_device_train_batch_size=4,
+        gradient_accumulation_steps=2,
         learning_rate=learning_rate,
         warmup_steps=100,
         logging_steps=10,
         save_steps=500,
         save_total_limit=2,
-        fp16=True,
+        bf16=use_bf16,
+        fp16=on_cuda and not use_bf16,
+        tf32=use_tf32 or None,
+        gradient_checkpointing=True,
+        gradient_checkpointing_kwargs={"use_reentrant": False},
+        # Paged 8-bit Adam states (bitsandbytes) need CUDA
+        optim="paged_adamw_8bit" if on_cuda else "adamw_torch",
         report_to="none",
         remove_unused_columns=False,
+        # Packed rows are already near max length; otherwise batch similar lengths
+        group_by_length=not packing,
+        dataloader_num_workers=4,
+        dataloader_pin_memory=True,
+        dataloader_persistent_workers=True,
+        dataloader_prefetch_factor=4,
+        # Pinned batches are copied with non_blocking=True
+        accelerator_config={"non_blocking": True},
+        torch_compile=use_compile,
+        torch_compile_mode="reduce-overhead" if use_compile else None,
     )
 
-    trainer = Trainer(
+    class PrefetchingTrainer(Trainer):
+        """Trainer whose train batches are prepared in a background thread."""
+
+        def get_train_dataloader(self):
+            return DataPrefetcher(super().get_train_dataloader(), device=self.args.device)
+
+    # Rows are already tokenized, so the collator only pads
+    if packing:
+        collator = PackedBatchCollator(tokenizer.pad_token_id, max_length if use_compile else None)
+    else:
+        collator = DataCollatorForLanguageModeling(
+            tokenizer=tokenizer, mlm=False, pad_to_multiple_of=8
+        )
+
+    trainer = PrefetchingTrainer(
         model=model,
         args=training_args,
         train_dataset=tokenized,
-        data_collator=DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False),
+        data_collator=collator,
     )
 
     trainer.train()
@@ -470,27 +1015,33 @@ Analyze this market update and explain your trading decision."""
         response = generate(model, tokenizer, prompt=prompt, max_tokens=200, verbose=False)
     else:
         import torch
+        from src.training.attention import attn_implementation as select_attn_implementation
         from transformers import AutoModelForCausalLM, AutoTokenizer
 
         tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
         model = AutoModelForCausalLM.from_pretrained(
             model_path,
             torch_dtype=torch.float16 if backend == "cuda" else torch.float32,
-            device_map="auto" if backend == "cuda" else None,
+            # Stream weights from safetensors straight onto the device instead
+            # of building an fp32 copy on the host first
+            device_map="auto" if backend == "cuda" else {"": "cpu"},
+            low_cpu_mem_usage=True,
+            attn_implementation=select_attn_implementation(backend),
             trust_remote_code=True,
         )
         messages = [{"role": "user", "content": test_prompt}]
         prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        inputs = tokenizer(prompt, return_tensors="pt")
-        if backend == "cuda":
-            inputs = {k: v.cuda() for k, v in inputs.items()}
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=200,
-            temperature=0.7,
-            do_sample=True,
-            pad_token_id=tokenizer.eos_token_id,
-        )
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        # Greedy: deterministic for a pass/fail check, and no sampling kernels
+        with torch.inference_mode():
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=200,
+                do_sample=False,
+                num_beams=1,
+                use_cache=True,
+                pad_token_id=tokenizer.eos_token_id,
+            )
         response = tokenizer.decode(
             outputs[0][inputs["input_ids"].shape[1] :], skip_special_tokens=True
         )
@@ -529,7 +1080,11 @@ async def main_async(args: argparse.Namespace) -> int:
             logger.error("DATABASE_URL not set and --source-dir/--csv not provided")
             return 1
         trajectories = await load_postgres_data(
-            database_url, args.min_actions, args.lookback_hours, args.max_trajectories
+            database_url,
+            args.min_actions,
+            args.lookback_hours,
+            args.max_trajectories,
+            cache_dir=os.path.join(args.output, ".cache") if args.trajectory_cache else None,
         )
         samples = trajectories_to_samples(trajectories)
 
@@ -548,7 +1103,14 @@ async def main_async(args: argparse.Namespace) -> int:
         base_model = model_name
     elif backend == "cuda":
         model_path = train_cuda(
-            samples, model_name, args.output, args.epochs, args.batch_size, args.lr, args.lora
+            samples,
+            model_name,
+            args.output,
+            args.epochs,
+            args.batch_size,
+            args.lr,
+            args.lora,
+            packing=args.packing,
         )
     else:
         model_path = train_cpu(samples, model_name, args.output, args.epochs, args.lr)
@@ -591,6 +1153,11 @@ def main() -> int:
     parser.add_argument(
         "--max-trajectories", type=int, default=500, help="Maximum trajectories to load"
     )
+    parser.add_argument(
+        "--trajectory-cache",
+        action="store_true",
+        help="Cache decoded database trajectories under <output>/.cache between runs",
+    )
 
     # Training options
     parser.add_argument("--output", default="./trained_models", help="Output directory")
@@ -601,6 +1168,12 @@ def main() -> int:
     parser.add_argument(
         "--lora", action=argparse.BooleanOptionalAction, default=True, help="Use LoRA (CUDA only)"
     )
+    parser.add_argument(
+        "--packing",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Pack samples into full-length sequences (CUDA with flash-attn only)",
+    )
     parser.add_argument(
         "--validate",
         action=argparse.BooleanOptionalAction,
@@ -17,19 +17,40 @@ Usage:
 """
 
 import asyncio
+import contextlib
+import importlib
+import json
 import logging
 import os
 import sys
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from dotenv import load_dotenv
 
-env_path = Path(__file__).parent.parent.parent.parent.parent / ".env"
+# scripts/ -> python/ -> training/ -> packages/ -> repo root
+REPO_ROOT = Path(__file__).resolve().parents[4]
+env_path = REPO_ROOT / ".env"
 if env_path.exists():
     load_dotenv(env_path)
 
+
+@dataclass(frozen=True, slots=True)
+class EnvConfig:
+    """Environment settings the checks read, resolved once after loading .env."""
+
+    database_url: str
+    openai_api_key: str
+
+
+ENV = EnvConfig(
+    database_url=os.getenv("DATABASE_URL", ""),
+    openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+)
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -42,13 +63,43 @@ class TestResult:
         self.details: dict = {}
 
 
+def _prewarm_import(module: str) -> None:
+    """Import ``module`` ahead of use; the check that needs it reports failures."""
+    with contextlib.suppress(ImportError):
+        importlib.import_module(module)
+
+
+async def _load_first_window(database_url: str, ctx: dict[str, Any]) -> dict[str, Any]:
+    """
+    Fetch the newest window's trajectories once and share them between checks.
+
+    Fills ``ctx`` with ``windows``, ``trajectories`` and their decoded
+    ``steps``; later calls return the cached data without touching the database.
+    """
+    if "trajectories" not in ctx:
+        from src.data_bridge.reader import PostgresTrajectoryReader, json_loads
+
+        # Reuse the pool opened by the connectivity check, if any
+        async with PostgresTrajectoryReader(database_url, pool=ctx.get("pool")) as reader:
+            windows = await reader.get_window_ids(min_agents=1, lookback_hours=168)
+            trajectories = (
+                await reader.get_trajectories_by_window(windows[0], min_actions=1)
+                if windows
+                else []
+            )
+        ctx["windows"] = windows
+        ctx["trajectories"] = trajectories
+        ctx["steps"] = [json_loads(traj.steps_json) for traj in trajectories]
+    return ctx
+
+
 def test_environment_variables() -> TestResult:
     """Test required environment variables."""
     result = TestResult("Environment Variables")
 
     checks = {
-        "DATABASE_URL": bool(os.getenv("DATABASE_URL")),
-        "OPENAI_API_KEY": bool(os.getenv("OPENAI_API_KEY")),
+        "DATABASE_URL": bool(ENV.database_url),
+        "OPENAI_API_KEY": bool(ENV.openai_api_key),
     }
 
     required = ["DATABASE_URL"]
@@ -70,92 +121,87 @@ def test_environment_variables() -> TestResult:
     return result
 
 
-async def test_database_connection() -> TestResult:
-    """Test database connectivity."""
+async def test_database_connection(ctx: dict[str, Any]) -> TestResult:
+    """Test database connectivity, keeping the connection pool in ``ctx`` for later checks."""
     result = TestResult("Database Connection")
 
-    database_url = os.getenv("DATABASE_URL", "")
+    database_url = ENV.database_url
     if not database_url:
         result.message = "DATABASE_URL not set"
         return result
 
     try:
-        import psycopg2
-
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM trajectories")
-        row = cur.fetchone()
-        if row is None:
-            cur.close()
-            conn.close()
-            result.message = "No trajectories found in database"
+        import asyncpg
+
+        pool = await asyncpg.create_pool(database_url, min_size=1, max_size=2)
+        ctx["pool"] = pool
+        # Row count is the planner's estimate: COUNT(*) would scan the whole table
+        count: int | None = await pool.fetchval(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass('trajectories')"
+        )
+        if count is None:
+            result.message = "Connected, but the trajectories table does not exist"
             return result
-        count: int = row[0]
-        cur.close()
-        conn.close()
 
         result.passed = True
-        result.message = f"Connected. Found {count} trajectories"
-        result.details["trajectory_count"] = count
+        if count < 0:
+            # Never analyzed, so there is no estimate yet
+            result.message = "Connected. Trajectory count not yet estimated"
+        else:
+            result.message = f"Connected. Found ~{count} trajectories"
+            result.details["trajectory_count_estimate"] = count
 
     except ImportError:
-        result.message = "psycopg2 not installed. Run: pip install psycopg2-binary"
+        result.message = "asyncpg not installed. Run: pip install asyncpg"
     except Exception as e:
         result.message = f"Connection failed: {e}"
 
     return result
 
 
-async def test_trajectory_data() -> TestResult:
+async def test_trajectory_data(ctx: dict[str, Any]) -> TestResult:
     """Test that real trajectory data exists."""
     result = TestResult("Real Trajectory Data")
 
-    database_url = os.getenv("DATABASE_URL", "")
+    database_url = ENV.database_url
     if not database_url:
         result.message = "DATABASE_URL not set"
         return result
 
     try:
-        from src.data_bridge import PostgresTrajectoryReader
+        data = await _load_first_window(database_url, ctx)
+        windows = data["windows"]
+        trajectories = data["trajectories"]
 
-        async with PostgresTrajectoryReader(database_url) as reader:
-            windows = await reader.get_window_ids(min_agents=1, lookback_hours=168)
+        if not windows:
+            result.message = "No trajectory windows found"
+            return result
 
-            if not windows:
-                result.message = "No trajectory windows found"
-                return result
-
-            trajectories = await reader.get_trajectories_by_window(windows[0], min_actions=1)
-
-            with_llm_calls = 0
-            total_llm_calls = 0
-
-            for traj in trajectories:
-                import json
-
-                steps = json.loads(traj.steps_json)
-                has_calls = False
-                for step in steps:
-                    llm_calls = step.get("llmCalls") or step.get("llm_calls") or []
-                    if llm_calls:
-                        total_llm_calls += len(llm_calls)
-                        has_calls = True
-                if has_calls:
-                    with_llm_calls += 1
-
-            result.passed = with_llm_calls > 0
-            result.message = (
-                f"Found {len(windows)} windows, "
-                f"{len(trajectories)} trajectories in first window, "
-                f"{with_llm_calls} have LLM calls ({total_llm_calls} total calls)"
-            )
-            result.details = {
-                "windows": len(windows),
-                "trajectories": len(trajectories),
-                "with_llm_calls": with_llm_calls,
-                "total_llm_calls": total_llm_calls,
-            }
+        with_llm_calls = 0
+        total_llm_calls = 0
+
+        for steps in data["steps"]:
+            has_calls = False
+            for step in steps:
+                llm_calls = step.get("llmCalls") or step.get("llm_calls") or []
+                if llm_calls:
+                    total_llm_calls += len(llm_calls)
+                    has_calls = True
+            if has_calls:
+                with_llm_calls += 1
+
+        result.passed = with_llm_calls > 0
+        result.message = (
+            f"Found {len(windows)} windows, "
+            f"{len(trajectories)} trajectories in first window, "
+            f"{with_llm_calls} have LLM calls ({total_llm_calls} total calls)"
+        )
+        result.details = {
+            "windows": len(windows),
+            "trajectories": len(trajectories),
+            "with_llm_calls": with_llm_calls,
+            "total_llm_calls": total_llm_calls,
+        }
 
     except Exception as e:
         result.message = f"Failed: {e}"
@@ -166,32 +212,23 @@ async def test_trajectory_data() -> TestResult:
     return result
 
 
-async def test_data_conversion() -> TestResult:
+async def test_data_conversion(ctx: dict[str, Any]) -> TestResult:
     """Test conversion of trajectories to training samples."""
     result = TestResult("Data Conversion")
 
-    database_url = os.getenv("DATABASE_URL", "")
+    database_url = ENV.database_url
     if not database_url:
         result.message = "DATABASE_URL not set"
         return result
 
     try:
-        import json
-
-        from src.data_bridge import PostgresTrajectoryReader
-
-        async with PostgresTrajectoryReader(database_url) as reader:
-            windows = await reader.get_window_ids(min_agents=1, lookback_hours=168)
-
-            if not windows:
-                result.message = "No windows found"
-                return result
-
-            trajectories = await reader.get_trajectories_by_window(windows[0], min_actions=1)
+        data = await _load_first_window(database_url, ctx)
+        if not data["windows"]:
+            result.message = "No windows found"
+            return result
 
         samples = []
-        for traj in trajectories:
-            steps = json.loads(traj.steps_json)
+        for steps in data["steps"]:
             for step in steps:
                 llm_calls = step.get("llmCalls") or step.get("llm_calls") or []
                 for llm_call in llm_calls:
@@ -249,22 +286,60 @@ def test_mlx_backend() -> TestResult:
     return result
 
 
-def test_cuda_backend() -> TestResult:
-    """Test CUDA backend availability."""
+def _query_nvidia_smi() -> tuple[str, float] | None:
+    """First GPU's name and memory in GB from nvidia-smi, or None if unavailable."""
+    import shutil
+    import subprocess
+
+    nvidia_smi = shutil.which("nvidia-smi")
+    if nvidia_smi is None:
+        return None
+    try:
+        out = subprocess.check_output(
+            [nvidia_smi, "--query-gpu=name,memory.total", "--format=csv,noheader,nounits"],
+            timeout=2,
+            text=True,
+        )
+        name, memory_mib = out.splitlines()[0].rsplit(",", 1)
+        return name.strip(), float(memory_mib) * 2**20 / 1e9
+    except (OSError, subprocess.SubprocessError, IndexError, ValueError):
+        return None
+
+
+def test_cuda_backend(skip_cuda_init: bool = False) -> TestResult:
+    """
+    Test CUDA backend availability.
+
+    With ``skip_cuda_init`` the GPU is looked up with nvidia-smi and PyTorch is
+    only checked for a CUDA build, without initializing the CUDA runtime. That
+    is faster but cannot tell whether PyTorch can actually use the device
+    (e.g. a CUDA wheel newer than the driver).
+    """
     result = TestResult("CUDA Backend")
 
     try:
+        # nvidia-smi answers without initializing the CUDA runtime in this process
+        gpu = _query_nvidia_smi() if skip_cuda_init else None
+
         import torch
 
-        if torch.cuda.is_available():
+        if gpu is not None and torch.version.cuda is not None:
+            device_name, vram = gpu
+        elif gpu is not None:
+            result.message = f"GPU found ({gpu[0]}) but PyTorch was built without CUDA"
+            return result
+        elif torch.cuda.is_available():
             device_name = torch.cuda.get_device_name(0)
             vram = torch.cuda.get_device_properties(0).total_memory / 1e9
-
-            result.passed = True
-            result.message = f"CUDA available: {device_name} ({vram:.1f} GB)"
-            result.details = {"device": device_name, "vram_gb": vram}
         else:
             result.message = "PyTorch installed but CUDA not available"
+            return result
+
+        result.passed = True
+        result.message = f"CUDA available: {device_name} ({vram:.1f} GB)"
+        if gpu is not None:
+            result.message += " - CUDA init skipped"
+        result.details = {"device": device_name, "vram_gb": vram}
 
     except ImportError as e:
         result.message = f"PyTorch not installed: {e}"
@@ -357,31 +432,24 @@ def test_rewards_on_trajectory(trajectory_data: dict) -> dict:
     }
 
 
-async def test_reward_functions() -> TestResult:
+async def test_reward_functions(ctx: dict[str, Any]) -> TestResult:
     """Test reward functions on real data."""
     result = TestResult("Reward Functions")
 
-    database_url = os.getenv("DATABASE_URL", "")
+    database_url = ENV.database_url
     if not database_url:
         result.message = "DATABASE_URL not set"
         return result
 
     try:
-        import json
-
-        from src.data_bridge import PostgresTrajectoryReader
-
-        async with PostgresTrajectoryReader(database_url) as reader:
-            windows = await reader.get_window_ids(min_agents=1, lookback_hours=168)
-            if not windows:
-                result.message = "No windows found"
-                return result
-
-            trajectories = await reader.get_trajectories_by_window(windows[0], min_actions=1)
+        data = await _load_first_window(database_url, ctx)
+        if not data["windows"]:
+            result.message = "No windows found"
+            return result
 
         scores = []
-        for traj in trajectories[:5]:  # Test first 5
-            steps = json.loads(traj.steps_json)
+        # Test first 5
+        for traj, steps in zip(data["trajectories"][:5], data["steps"][:5], strict=True):
             traj_data = {
                 "trajectory_id": traj.trajectory_id,
                 "final_pnl": traj.final_pnl or 0.0,
@@ -412,10 +480,21 @@ async def test_reward_functions() -> TestResult:
 async def main() -> int:
     import argparse
 
+    # The database checks import these lazily, one after another on the critical
+    # path; load them in the background while the connection is being opened
+    loop = asyncio.get_running_loop()
+    for module in ("asyncpg", "src.data_bridge", "src.training.rewards"):
+        loop.run_in_executor(None, _prewarm_import, module)
+
     parser = argparse.ArgumentParser(description="Validate training pipeline")
     parser.add_argument(
         "--test-rewards", action="store_true", help="Also test reward functions on data"
     )
+    parser.add_argument(
+        "--skip-cuda-init",
+        action="store_true",
+        help="Detect the GPU with nvidia-smi instead of initializing CUDA in PyTorch",
+    )
     args = parser.parse_args()
 
     print("=" * 70)
@@ -423,31 +502,58 @@ async def main() -> int:
     print("=" * 70)
     print()
 
-    # Run tests
+    # Database checks share one connection pool and one fetch of the newest window
+    ctx: dict[str, Any] = {}
+
+    async def database_checks() -> list[TestResult]:
+        # Sequential: later checks reuse the pool and rows cached in ctx
+        results = [
+            await test_database_connection(ctx),
+            await test_trajectory_data(ctx),
+            await test_data_conversion(ctx),
+        ]
+        if args.test_rewards:
+            results.append(await test_reward_functions(ctx))
+        return results
+
+    # The backend probes are import-bound (CUDA init alone can take seconds) and
+    # independent of the database, so run them in threads alongside it
+    try:
+        env_result, db_results, transformers_result, mlx_result, cuda_result = await asyncio.gather(
+            asyncio.to_thread(test_environment_variables),
+            database_checks(),
+            asyncio.to_thread(test_transformers),
+            asyncio.to_thread(test_mlx_backend),
+            asyncio.to_thread(test_cuda_backend, args.skip_cuda_init),
+        )
+    finally:
+        if "pool" in ctx:
+            await ctx["pool"].close()
+
     tests = [
-        ("Environment Variables", test_environment_variables()),
-        ("Database Connection", await test_database_connection()),
-        ("Real Trajectory Data", await test_trajectory_data()),
-        ("Data Conversion", await test_data_conversion()),
-        ("Transformers Library", test_transformers()),
-        ("MLX Backend", test_mlx_backend()),
-        ("CUDA Backend", test_cuda_backend()),
+        ("Environment Variables", env_result),
+        ("Database Connection", db_results[0]),
+        ("Real Trajectory Data", db_results[1]),
+        ("Data Conversion", db_results[2]),
+        ("Transformers Library", transformers_result),
+        ("MLX Backend", mlx_result),
+        ("CUDA Backend", cuda_result),
     ]
-
     if args.test_rewards:
-        tests.append(("Reward Functions", await test_reward_functions()))
+        tests.append(("Reward Functions", db_results[3]))
 
     passed = 0
     failed = 0
 
+    # Build the report as one string so it goes out in a single write
+    lines: list[str] = []
     for _name, result in tests:
         status = "✓" if result.passed else "✗"
-        print(f"{status} {result.name}")
-        print(f"   {result.message}")
+        lines.append(f"{status} {result.name}")
+        lines.append(f"   {result.message}")
         if result.details:
-            for k, v in result.details.items():
-                print(f"   - {k}: {v}")
-        print()
+            lines.extend(f"   - {k}: {v}" for k, v in result.details.items())
+        lines.append("")
 
         if result.passed:
             passed += 1
@@ -455,9 +561,10 @@ async def main() -> int:
             failed += 1
 
     # Summary
-    print("=" * 70)
-    print(f"  RESULTS: {passed} passed, {failed} failed")
-    print("=" * 70)
+    lines.append("=" * 70)
+    lines.append(f"  RESULTS: {passed} passed, {failed} failed")
+    lines.append("=" * 70)
+    print("\n".join(lines))
 
     # Required checks
     required_tests = [
@@ -10,10 +10,12 @@ import json
 import random
 from dataclasses import dataclass, field
 
+import numpy as np
+
 from ..models import AtroposScoredGroup as PydanticScoredGroup
 from ..models import JejuTrajectory, MarketOutcomes
 from ..training.quality_utils import calculate_detailed_tick_quality
-from ..training.rewards import TrajectoryRewardInputs, calculate_risk_reward, composite_reward
+from ..training.rewards import TrajectoryRewardInputs, calculate_risk_rewards, composite_reward
 
 
 @dataclass
@@ -132,21 +134,44 @@ class JejuToAtroposConverter:
 
         total_format_score = 0.0
         total_reasoning_score = 0.0
-        risky_actions_count = 0
+        open_positions: list[int] = []
+        action_types: list[str] = []
         valid_ticks_for_scoring = 0
+        archetype = jeju_traj.archetype
 
         for step in steps:
-            # 1. Message Generation
-            if step.llm_calls:
-                for llm_call in step.llm_calls:
+            # Read each step field once; the loop body uses them repeatedly
+            llm_calls = step.llm_calls
+            action = step.action
+            env_state = step.environment_state
+
+            if llm_calls:
+                # 1. Message Generation
+                for llm_call in llm_calls:
                     if not llm_call.user_prompt or not llm_call.response:
                         continue
 
                     messages.append(AtroposMessage(role="user", content=llm_call.user_prompt))
                     messages.append(AtroposMessage(role="assistant", content=llm_call.response))
+
+                # 2. Quality & Risk Scoring (only ticks with LLM interaction)
+                valid_ticks_for_scoring += 1
+
+                # A. Detailed Quality (Format + Reasoning)
+                fmt_score, rsn_score = calculate_detailed_tick_quality(
+                    llm_calls,
+                    action,
+                    None,  # No explicit feedback dict in standard steps yet
+                    archetype,
+                )
+                total_format_score += fmt_score
+                total_reasoning_score += rsn_score
+
+                # B. Risk inputs, scored for all ticks at once below
+                open_positions.append(env_state.open_positions)
+                action_types.append(action.action_type if action else "wait")
             else:
                 # Fallback: build from environment state
-                env_state = step.environment_state
                 user_content = (
                     f"Market Update:\n"
                     f"- Balance: ${env_state.agent_balance:.2f}\n"
@@ -155,36 +180,16 @@ class JejuToAtroposConverter:
                 )
                 messages.append(AtroposMessage(role="user", content=user_content))
 
-                action = step.action
                 if action:
                     assistant_content = f"Action: {action.action_type}"
                     if action.parameters:
                         assistant_content += f"\nParameters: {json.dumps(action.parameters)}"
                     messages.append(AtroposMessage(role="assistant", content=assistant_content))
 
-            # 2. Quality & Risk Scoring
-            if step.llm_calls:  # Only score ticks with LLM interaction
-                valid_ticks_for_scoring += 1
-
-                # A. Detailed Quality (Format + Reasoning)
-                fmt_score, rsn_score = calculate_detailed_tick_quality(
-                    step.llm_calls,
-                    step.action,
-                    None,  # No explicit feedback dict in standard steps yet
-                    jeju_traj.archetype,
-                )
-                total_format_score += fmt_score
-                total_reasoning_score += rsn_score
-
-                # B. Risk Calculation
-                # Use open_positions as a rough proxy for exposure if active_markets is available
-                # Assuming ~10% exposure per position for simulation logic
-                exposure_proxy = min(1.0, step.environment_state.open_positions * 0.1)
-
-                act_type = step.action.action_type if step.action else "wait"
-                risk_penalty = calculate_risk_reward(exposure_proxy, act_type)
-                if risk_penalty < 0:
-                    risky_actions_count += 1
+        # Use open_positions as a rough proxy for exposure if active_markets is available
+        # Assuming ~10% exposure per position for simulation logic
+        exposures = np.minimum(1.0, np.asarray(open_positions, dtype=np.float64) * 0.1)
+        risky_actions_count = int((calculate_risk_rewards(exposures, action_types) < 0).sum())
 
         if len(messages) < 3:
             # We assume at least System + User + Assistant
@@ -5,27 +5,72 @@ Reads trajectories from PostgreSQL database or local JSON files for training.
 Validates LLM call quality to ensure training data authenticity.
 """
 
+import asyncio
 import json
 import logging
 import os
+import sys
+import threading
+import weakref
+from collections.abc import AsyncIterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
+from uuid import uuid4
 
-from pydantic import BaseModel, field_validator
 from typing_extensions import Self
 
-# Handle optional psycopg2 import for JSON-only workflows.
+# Handle optional database driver imports for JSON-only workflows. The async
+# reader uses asyncpg; the synchronous helper functions use psycopg2.
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
 try:
     import psycopg2
+    import psycopg2.pool
 except ImportError:
     psycopg2 = None
 
+# orjson is an optional, faster drop-in for JSON decoding.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Rows per server-side cursor round trip. Each row carries a full stepsJson
+# blob, so small batches keep peak memory at a few rows' worth.
+_CURSOR_BATCH_SIZE = 64
+
+# validate_llm_calls needs 3 steps, each with a call whose system prompt, user
+# prompt and response are 20+ characters, so any shorter stepsJson is rejected.
+# octet_length reads the stored size without detoasting or parsing the blob,
+# which lets Postgres drop such rows before they are sent.
+_MIN_VALID_STEPS_JSON_BYTES = 3 * 3 * 20
+
+# Column order expected by _row_to_trajectory
+_TRAJECTORY_COLUMNS = """
+    "trajectoryId", "agentId", "windowId", "stepsJson", "metricsJson", "metadataJson",
+    "totalReward", "episodeLength", "finalStatus", "finalPnL", "tradesExecuted",
+    "aiJudgeReward", "archetype"
+"""
+_TRAJECTORY_COLUMNS_WITHOUT_STEPS = _TRAJECTORY_COLUMNS.replace(' "stepsJson",', "")
+
+
+def json_loads(data: str | bytes) -> Any:
+    """Decode JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
-class TrajectoryRow(BaseModel):
-    """Raw trajectory data from database. Used by PostgresTrajectoryReader."""
 
-    model_config = {"frozen": False, "extra": "ignore"}
+@dataclass(slots=True)
+class TrajectoryRow:
+    """Raw trajectory data from database. Used by PostgresTrajectoryReader."""
 
     trajectory_id: str
     agent_id: str
@@ -41,40 +86,42 @@ class TrajectoryRow(BaseModel):
     ai_judge_reward: float | None = None
     archetype: str | None = None
 
-    @field_validator("total_reward", mode="before")
-    @classmethod
-    def coerce_total_reward(cls, v):
-        return float(v) if v is not None else 0.0
-
-    @field_validator("episode_length", mode="before")
-    @classmethod
-    def coerce_episode_length(cls, v):
-        return int(v) if v is not None else 0
-
-    @field_validator("final_status", mode="before")
-    @classmethod
-    def coerce_final_status(cls, v):
-        return v if v is not None else "unknown"
-
-    @field_validator("final_pnl", mode="before")
-    @classmethod
-    def coerce_final_pnl(cls, v):
-        return float(v) if v is not None else None
-
-    @field_validator("trades_executed", mode="before")
-    @classmethod
-    def coerce_trades_executed(cls, v):
-        return int(v) if v is not None else None
 
-    @field_validator("ai_judge_reward", mode="before")
-    @classmethod
-    def coerce_ai_judge_reward(cls, v):
-        return float(v) if v is not None else None
+def _row_to_trajectory(row: Sequence[Any]) -> TrajectoryRow:
+    """Build a TrajectoryRow from a trajectories SELECT row, coercing NULLs and numerics."""
+    # Agents, windows, statuses and archetypes repeat across many rows; interning
+    # keeps one string object per distinct value instead of one per row
+    return TrajectoryRow(
+        trajectory_id=row[0],
+        agent_id=sys.intern(row[1]),
+        window_id=sys.intern(row[2]),
+        steps_json=row[3],
+        metrics_json=row[4],
+        metadata_json=row[5],
+        total_reward=float(row[6]) if row[6] is not None else 0.0,
+        episode_length=int(row[7]) if row[7] is not None else 0,
+        final_status=sys.intern(row[8]) if row[8] is not None else "unknown",
+        final_pnl=float(row[9]) if row[9] is not None else None,
+        trades_executed=int(row[10]) if row[10] is not None else None,
+        ai_judge_reward=float(row[11]) if row[11] is not None else None,
+        archetype=sys.intern(row[12]) if row[12] is not None else None,
+    )
+
+
+# One psycopg2 pool per database URL, shared by the module-level helpers so
+# each call skips the connect/TLS/auth round trips
+_POOLS: dict[str, Any] = {}
+# The pool each checked-out connection came from, so release_connection
+# doesn't depend on DATABASE_URL still matching
+_CONN_POOLS: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+_POOLS_LOCK = threading.Lock()
 
 
 def get_connection():
     """
-    Get PostgreSQL connection from environment.
+    Get a pooled PostgreSQL connection for DATABASE_URL.
+
+    Hand it back with ``release_connection`` rather than closing it.
 
     Returns:
         psycopg2 connection
@@ -90,10 +137,26 @@ def get_connection():
     database_url = os.environ.get("DATABASE_URL")
     if not database_url:
         raise ValueError("DATABASE_URL environment variable required")
-    return psycopg2.connect(database_url)
-
-
-def validate_llm_calls(steps: list, min_steps_with_llm: int = 3) -> tuple[bool, list[str]]:
+    with _POOLS_LOCK:
+        pool = _POOLS.get(database_url)
+        if pool is None:
+            pool = _POOLS[database_url] = psycopg2.pool.ThreadedConnectionPool(1, 10, database_url)
+    conn = pool.getconn()
+    with _POOLS_LOCK:
+        _CONN_POOLS[conn] = pool
+    return conn
+
+
+def release_connection(conn) -> None:
+    """Return a connection from ``get_connection`` to its pool, rolling back any open transaction."""
+    with _POOLS_LOCK:
+        pool = _CONN_POOLS.pop(conn)
+    pool.putconn(conn)
+
+
+def validate_llm_calls(
+    steps: list, min_steps_with_llm: int = 3, collect_issues: bool = True
+) -> tuple[bool, list[str]]:
     """
     Validate trajectory steps contain real LLM calls.
 
@@ -103,6 +166,9 @@ def validate_llm_calls(steps: list, min_steps_with_llm: int = 3) -> tuple[bool,
     Args:
         steps: List of trajectory steps
         min_steps_with_llm: Minimum steps with valid LLM calls
+        collect_issues: Describe every problem found. When False, stop at the
+            first invalid call and return no issues, for callers that only
+            need the verdict.
 
     Returns:
         Tuple of (is_valid, list of issue descriptions)
@@ -111,7 +177,8 @@ def validate_llm_calls(steps: list, min_steps_with_llm: int = 3) -> tuple[bool,
     steps_with_llm = 0
 
     if not steps:
-        issues.append("Trajectory has no steps.")
+        if collect_issues:
+            issues.append("Trajectory has no steps.")
         return False, issues
 
     for i, step in enumerate(steps):
@@ -125,6 +192,13 @@ def validate_llm_calls(steps: list, min_steps_with_llm: int = 3) -> tuple[bool,
             user_prompt = call.get("userPrompt") or call.get("user_prompt") or ""
             response = call.get("response") or ""
 
+            if len(system_prompt) >= 20 and len(user_prompt) >= 20 and len(response) >= 20:
+                valid_calls_in_step += 1
+                continue
+            # Any invalid call rejects the trajectory, so the rest can't change the verdict
+            if not collect_issues:
+                return False, issues
+
             call_issues = []
             if len(system_prompt) < 20:
                 call_issues.append("system_prompt too short")
@@ -132,16 +206,14 @@ def validate_llm_calls(steps: list, min_steps_with_llm: int = 3) -> tuple[bool,
                 call_issues.append("user_prompt too short")
             if len(response) < 20:
                 call_issues.append("response too short")
-
-            if not call_issues:
-                valid_calls_in_step += 1
-            else:
-                issues.append(f"Step {i}, Call {call_idx}: " + ", ".join(call_issues))
+            issues.append(f"Step {i}, Call {call_idx}: " + ", ".join(call_issues))
 
         if valid_calls_in_step > 0:
             steps_with_llm += 1
 
     if steps_with_llm < min_steps_with_llm:
+        if not collect_issues:
+            return False, issues
         issues.append(
             f"Only {steps_with_llm}/{len(steps)} steps have valid LLM calls (need at least {min_steps_with_llm})"
         )
@@ -150,24 +222,31 @@ def validate_llm_calls(steps: list, min_steps_with_llm: int = 3) -> tuple[bool,
 
 
 class PostgresTrajectoryReader:
-    """Reads Jeju trajectories from a PostgreSQL database."""
+    """
+    Reads Jeju trajectories from a PostgreSQL database through an asyncpg pool.
 
-    def __init__(self, database_url: str):
-        if psycopg2 is None:
+    Pass ``pool`` to reuse an already-open asyncpg pool across readers; the
+    caller keeps ownership and it is not closed on exit.
+    """
+
+    def __init__(self, database_url: str, pool: Any = None):
+        if asyncpg is None:
             raise ImportError(
-                "psycopg2 is not installed for PostgresTrajectoryReader. Please install it with 'pip install psycopg2-binary'"
+                "asyncpg is not installed for PostgresTrajectoryReader. Please install it with 'pip install asyncpg'"
             )
         if not database_url:
             raise ValueError("DATABASE_URL must be provided for PostgresTrajectoryReader")
         self.db_url = database_url
-        self.conn = None
+        self.pool = pool
+        self._owns_pool = pool is None
 
     async def __aenter__(self) -> Self:
-        """Connect to the database upon entering the async context."""
+        """Open the connection pool upon entering the async context."""
         # Check to satisfy Pylance's static analysis
-        if psycopg2 is None:
-            raise ImportError("psycopg2 is not installed, cannot connect to database.")
-        self.conn = psycopg2.connect(self.db_url)
+        if asyncpg is None:
+            raise ImportError("asyncpg is not installed, cannot connect to database.")
+        if self._owns_pool:
+            self.pool = await asyncpg.create_pool(self.db_url, min_size=2, max_size=10)
         return self
 
     async def __aexit__(
@@ -176,9 +255,10 @@ class PostgresTrajectoryReader:
         exc_val: BaseException | None,
         exc_tb: object,
     ) -> None:
-        """Close the database connection upon exiting the context."""
-        if self.conn:
-            self.conn.close()
+        """Close the connection pool upon exiting the context."""
+        if self.pool and self._owns_pool:
+            await self.pool.close()
+            self.pool = None
 
     async def get_window_ids(
         self,
@@ -187,20 +267,17 @@ class PostgresTrajectoryReader:
         lookback_hours: int = 168,
         min_agents: int = 1,  # noqa: ARG002 - reserved for future filtering
     ) -> list[str]:
-        if not self.conn:
+        if not self.pool:
             raise ConnectionError("Database not connected.")
-        with self.conn.cursor() as cur:
-            query = """
-                SELECT DISTINCT "windowId" FROM trajectories
-                WHERE "isTrainingData" = true AND "createdAt" > NOW() - INTERVAL '%s hours'
-            """
-            params = [lookback_hours]
-            if only_scored:
-                query += ' AND "aiJudgeReward" IS NOT NULL'
-            query += ' ORDER BY "windowId" DESC LIMIT %s'
-            params.append(limit)
-            cur.execute(query, tuple(params))
-            return [row[0] for row in cur.fetchall() if row[0]]
+        query = """
+            SELECT DISTINCT "windowId" FROM trajectories
+            WHERE "isTrainingData" = true AND "createdAt" > NOW() - make_interval(hours => $1)
+        """
+        if only_scored:
+            query += ' AND "aiJudgeReward" IS NOT NULL'
+        query += ' ORDER BY "windowId" DESC LIMIT $2'
+        rows = await self.pool.fetch(query, int(lookback_hours), limit)
+        return [row[0] for row in rows if row[0]]
 
     async def get_trajectories_by_window(
         self,
@@ -209,53 +286,180 @@ class PostgresTrajectoryReader:
         validate: bool = True,
         min_actions: int = 1,
     ) -> list[TrajectoryRow]:
-        if not self.conn:
+        if not self.pool:
+            raise ConnectionError("Database not connected.")
+        rows_by_window = await self._read_windows([window_id], min_score, validate, min_actions)
+        return rows_by_window[window_id]
+
+    async def get_trajectories_by_windows_batch(
+        self,
+        window_ids: list[str],
+        min_score: float | None = None,
+        validate: bool = True,
+        min_actions: int = 1,
+    ) -> dict[str, list[TrajectoryRow]]:
+        """
+        Fetch several windows with a single query.
+
+        Returns:
+            Trajectories grouped by window, keyed in the order of ``window_ids``
+        """
+        if not self.pool:
             raise ConnectionError("Database not connected.")
-        with self.conn.cursor() as cur:
-            query = """
-                SELECT "trajectoryId", "agentId", "windowId", "stepsJson", "metricsJson", "metadataJson",
-                       "totalReward", "episodeLength", "finalStatus", "finalPnL", "tradesExecuted",
-                       "aiJudgeReward", "archetype"
-                FROM trajectories WHERE "windowId" = %s AND "isTrainingData" = true AND "episodeLength" >= %s
+        return await self._read_windows(window_ids, min_score, validate, min_actions)
+
+    async def get_windows_fingerprint(self, window_ids: list[str]) -> str:
+        """
+        Cheap fingerprint of the training rows in ``window_ids``.
+
+        Built from the row count and the newest ``createdAt``, so it changes
+        whenever trajectories are written to any of the windows.
+        """
+        if not self.pool:
+            raise ConnectionError("Database not connected.")
+        count, newest = await self.pool.fetchrow(
             """
-            params: list = [window_id, min_actions]
-            if min_score is not None:
-                query += ' AND "aiJudgeReward" >= %s'
-                params.append(min_score)
-            cur.execute(query, tuple(params))
-            rows = cur.fetchall()
+            SELECT count(*), max("createdAt") FROM trajectories
+            WHERE "windowId" = ANY($1::text[]) AND "isTrainingData" = true
+            """,
+            list(window_ids),
+        )
+        return f"{count}:{newest.isoformat() if newest else ''}"
 
-        results = []
-        for row in rows:
-            # Pydantic validators handle None coercion
-            trajectory = TrajectoryRow(
-                trajectory_id=row[0],
-                agent_id=row[1],
-                window_id=row[2],
-                steps_json=row[3],
-                metrics_json=row[4],
-                metadata_json=row[5],
-                total_reward=row[6],
-                episode_length=row[7],
-                final_status=row[8],
-                final_pnl=row[9],
-                trades_executed=row[10],
-                ai_judge_reward=row[11],
-                archetype=row[12],
+    async def iter_trajectories(
+        self,
+        window_ids: list[str],
+        min_score: float | None = None,
+        validate: bool = True,
+        min_actions: int = 1,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[TrajectoryRow]:
+        """
+        Stream trajectories for several windows through one server-side cursor.
+
+        Rows arrive ``batch_size`` at a time, in the order of ``window_ids``, so
+        callers can stop early without the rest being transferred or decoded.
+        """
+        if not self.pool:
+            raise ConnectionError("Database not connected.")
+        query, params = self._trajectories_query(window_ids, min_score, min_actions, validate)
+        query += ' ORDER BY array_position($1::text[], "windowId")'
+        async for rows in self._batches(query, params, batch_size):
+            # Decoding steps for validation is CPU-bound; keep it off the loop
+            trajectories = await asyncio.to_thread(self._to_trajectory_rows, rows, validate)
+            for trajectory in trajectories:
+                yield trajectory
+
+    async def _batches(self, query: str, params: list, batch_size: int) -> AsyncIterator[list]:
+        """Run ``query`` through a server-side cursor, yielding ``batch_size`` rows at a time."""
+        assert self.pool is not None
+        # asyncpg cursors keep the result set on the server, but only inside a
+        # transaction
+        async with self.pool.acquire() as conn, conn.transaction():
+            cursor = await conn.cursor(query, *params)
+            while True:
+                rows = await cursor.fetch(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    @staticmethod
+    def _trajectories_query(
+        window_ids: list[str],
+        min_score: float | None,
+        min_actions: int,
+        validate: bool,
+        columns: str = _TRAJECTORY_COLUMNS,
+    ) -> tuple[str, list]:
+        query = f"""
+            SELECT {columns}
+            FROM trajectories WHERE "windowId" = ANY($1::text[]) AND "isTrainingData" = true AND "episodeLength" >= $2
+        """
+        params: list = [list(window_ids), min_actions]
+        if min_score is not None:
+            params.append(min_score)
+            query += f' AND "aiJudgeReward" >= ${len(params)}'
+        if validate:
+            params.append(_MIN_VALID_STEPS_JSON_BYTES)
+            query += f' AND octet_length("stepsJson") >= ${len(params)}'
+        return query, params
+
+    @staticmethod
+    def _steps_are_valid(trajectory_id: str, steps_json: str) -> bool:
+        try:
+            steps = json_loads(steps_json)
+            # Issue text is only needed for the debug log
+            is_valid, issues = validate_llm_calls(
+                steps, collect_issues=logger.isEnabledFor(logging.DEBUG)
             )
-            if validate:
-                try:
-                    steps = json.loads(trajectory.steps_json)
-                    is_valid, issues = validate_llm_calls(steps)
-                    if not is_valid:
-                        logger.debug(f"Skipping DB trajectory {trajectory.trajectory_id}: {issues}")
-                        continue
-                except (json.JSONDecodeError, TypeError):
-                    logger.warning(
-                        f"Could not parse steps_json for trajectory {trajectory.trajectory_id}"
-                    )
-                    continue
-            results.append(trajectory)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        except (json.JSONDecodeError, TypeError):
+            logger.warning(f"Could not parse steps_json for trajectory {trajectory_id}")
+            return False
+        if not is_valid:
+            logger.debug(f"Skipping DB trajectory {trajectory_id}: {issues}")
+        return is_valid
+
+    @classmethod
+    def _to_trajectory_rows(cls, rows: list, validate: bool) -> list[TrajectoryRow]:
+        """Build TrajectoryRows, dropping those whose steps ``validate`` rejects."""
+        trajectories = [_row_to_trajectory(row) for row in rows]
+        if validate:
+            trajectories = [
+                t for t in trajectories if cls._steps_are_valid(t.trajectory_id, t.steps_json)
+            ]
+        return trajectories
+
+    @classmethod
+    def _valid_steps(cls, rows: list) -> dict[str, str]:
+        """Map trajectory id to steps_json for the ``(id, steps_json)`` rows that validate."""
+        return {
+            trajectory_id: steps_json
+            for trajectory_id, steps_json in rows
+            if cls._steps_are_valid(trajectory_id, steps_json)
+        }
+
+    async def _read_windows(
+        self,
+        window_ids: list[str],
+        min_score: float | None,
+        validate: bool,
+        min_actions: int,
+    ) -> dict[str, list[TrajectoryRow]]:
+        assert self.pool is not None
+        results: dict[str, list[TrajectoryRow]] = {window_id: [] for window_id in window_ids}
+        if not validate:
+            query, params = self._trajectories_query(window_ids, min_score, min_actions, validate)
+            async for rows in self._batches(query, params, _CURSOR_BATCH_SIZE):
+                for trajectory in map(_row_to_trajectory, rows):
+                    results.setdefault(trajectory.window_id, []).append(trajectory)
+            return results
+
+        # Validation only needs the steps, so fetch those first and pull the
+        # other columns just for the trajectories that pass
+        query, params = self._trajectories_query(
+            window_ids, min_score, min_actions, validate, columns='"trajectoryId", "stepsJson"'
+        )
+        steps_by_id: dict[str, str] = {}
+        async for rows in self._batches(query, params, _CURSOR_BATCH_SIZE):
+            # Decoding steps for validation is CPU-bound; keep it off the loop
+            steps_by_id.update(await asyncio.to_thread(self._valid_steps, rows))
+        if not steps_by_id:
+            return results
+
+        query = f"""
+            SELECT {_TRAJECTORY_COLUMNS_WITHOUT_STEPS}
+            FROM trajectories WHERE "trajectoryId" = ANY($1::text[])
+        """
+        rows = await self.pool.fetch(query, list(steps_by_id))
+        rows_by_id = {row[0]: row for row in rows}
+        for trajectory_id, steps_json in steps_by_id.items():
+            row = rows_by_id.get(trajectory_id)
+            if row is None:
+                # Deleted between the two queries
+                continue
+            trajectory = _row_to_trajectory((*row[:3], steps_json, *row[3:]))
+            results.setdefault(trajectory.window_id, []).append(trajectory)
         return results
 
 
@@ -273,22 +477,31 @@ class JsonTrajectoryReader:
         logger.info(f"Found {len(self._trajectories_by_window)} windows in {self._directory}")
 
     def _scan_files(self):
-        file_count = 0
-        for file_path in self._directory.glob("*.json"):
-            file_count += 1
-            try:
-                with file_path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                trajectory_data = data.get("trajectory", data)
-                window_id = trajectory_data.get("windowId", "default_window")
-                if window_id not in self._trajectories_by_window:
-                    self._trajectories_by_window[window_id] = []
-                self._trajectories_by_window[window_id].append(trajectory_data)
-            except (json.JSONDecodeError, KeyError, TypeError) as e:
-                logger.warning(f"Skipping invalid JSON file {file_path}: {e}")
-
-        if file_count == 0:
+        paths = list(self._directory.glob("*.json"))
+        if not paths:
             logger.warning(f"No JSON files found in directory: {self._directory}")
+            return
+
+        # Reads dominate on cold caches and network filesystems, so overlap them;
+        # results are merged here in glob order to keep window contents stable
+        max_workers = min(32, (os.cpu_count() or 1) * 4, len(paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for loaded in executor.map(self._load_file, paths):
+                if loaded is None:
+                    continue
+                window_id, trajectory_data = loaded
+                self._trajectories_by_window.setdefault(window_id, []).append(trajectory_data)
+
+    @staticmethod
+    def _load_file(file_path: Path) -> tuple[str, dict] | None:
+        """Read one trajectory file, returning ``(window_id, data)`` or None if invalid."""
+        try:
+            data = json_loads(file_path.read_bytes())
+            trajectory_data = data.get("trajectory", data)
+            return trajectory_data.get("windowId", "default_window"), trajectory_data
+        except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError) as e:
+            logger.warning(f"Skipping invalid JSON file {file_path}: {e}")
+            return None
 
     def get_window_ids(self) -> list[str]:
         return list(self._trajectories_by_window.keys())
@@ -308,16 +521,17 @@ def get_window_ids(limit: int = 100, only_scored: bool = True) -> list[str]:
     Returns:
         List of window IDs
     """
-    conn = get_connection()
-    cur = conn.cursor()
     query = 'SELECT DISTINCT "windowId" FROM trajectories WHERE "isTrainingData" = true'
     if only_scored:
         query += ' AND "aiJudgeReward" IS NOT NULL'
     query += ' ORDER BY "windowId" DESC LIMIT %s'
-    cur.execute(query, (limit,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query, (limit,))
+            rows = cur.fetchall()
+    finally:
+        release_connection(conn)
     return [row[0] for row in rows if row[0]]
 
 
@@ -337,8 +551,6 @@ def get_trajectories_by_window(
     Returns:
         List of trajectory rows
     """
-    conn = get_connection()
-    cur = conn.cursor()
     query = """
         SELECT "trajectoryId", "agentId", "windowId", "stepsJson", "metricsJson", "metadataJson",
                "totalReward", "episodeLength", "finalStatus", "finalPnL", "tradesExecuted",
@@ -349,34 +561,27 @@ def get_trajectories_by_window(
     if min_score is not None:
         query += ' AND "aiJudgeReward" >= %s'
         params.append(min_score)
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    if validate:
+        query += ' AND octet_length("stepsJson") >= %s'
+        params.append(_MIN_VALID_STEPS_JSON_BYTES)
     results: list[TrajectoryRow] = []
-    for row in rows:
-        # Pydantic validators handle None coercion
-        trajectory = TrajectoryRow(
-            trajectory_id=row[0],
-            agent_id=row[1],
-            window_id=row[2],
-            steps_json=row[3],
-            metrics_json=row[4],
-            metadata_json=row[5],
-            total_reward=row[6],
-            episode_length=row[7],
-            final_status=row[8],
-            final_pnl=row[9],
-            trades_executed=row[10],
-            ai_judge_reward=row[11],
-            archetype=row[12],
-        )
-        if validate:
-            steps = json.loads(trajectory.steps_json)
-            is_valid, _ = validate_llm_calls(steps)
-            if not is_valid:
-                continue
-        results.append(trajectory)
+    conn = get_connection()
+    try:
+        # A named cursor keeps the result set on the server and pulls it in small
+        # batches, so rejected rows are dropped before the next batch arrives
+        with conn.cursor(name=f"traj_{uuid4().hex}") as cur:
+            cur.itersize = _CURSOR_BATCH_SIZE
+            cur.execute(query, params)
+            for row in cur:
+                trajectory = _row_to_trajectory(row)
+                if validate:
+                    steps = json_loads(trajectory.steps_json)
+                    is_valid, _ = validate_llm_calls(steps, collect_issues=False)
+                    if not is_valid:
+                        continue
+                results.append(trajectory)
+    finally:
+        release_connection(conn)
     return results
 
 
@@ -396,8 +601,6 @@ def get_all_training_trajectories(
     Returns:
         List of trajectory rows
     """
-    conn = get_connection()
-    cur = conn.cursor()
     query = """
         SELECT "trajectoryId", "agentId", "windowId", "stepsJson", "metricsJson", "metadataJson",
                "totalReward", "episodeLength", "finalStatus", "finalPnL", "tradesExecuted",
@@ -413,42 +616,30 @@ def get_all_training_trajectories(
         params.append(archetype)
     query += ' ORDER BY "createdAt" DESC LIMIT %s'
     params.append(limit)
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    # Pydantic validators handle None coercion
-    return [
-        TrajectoryRow(
-            trajectory_id=r[0],
-            agent_id=r[1],
-            window_id=r[2],
-            steps_json=r[3],
-            metrics_json=r[4],
-            metadata_json=r[5],
-            total_reward=r[6],
-            episode_length=r[7],
-            final_status=r[8],
-            final_pnl=r[9],
-            trades_executed=r[10],
-            ai_judge_reward=r[11],
-            archetype=r[12],
-        )
-        for r in rows
-    ]
+    conn = get_connection()
+    try:
+        # Stream through a named cursor rather than holding every raw row
+        # alongside the TrajectoryRows built from them
+        with conn.cursor(name=f"traj_{uuid4().hex}") as cur:
+            cur.itersize = _CURSOR_BATCH_SIZE
+            cur.execute(query, params)
+            return [_row_to_trajectory(row) for row in cur]
+    finally:
+        release_connection(conn)
 
 
 def get_trajectory_stats() -> dict:
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(*), COUNT("aiJudgeReward"), AVG("aiJudgeReward"),
-               MIN("aiJudgeReward"), MAX("aiJudgeReward"), COUNT(DISTINCT "archetype")
-        FROM trajectories WHERE "isTrainingData" = true
-    """)
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*), COUNT("aiJudgeReward"), AVG("aiJudgeReward"),
+                       MIN("aiJudgeReward"), MAX("aiJudgeReward"), COUNT(DISTINCT "archetype")
+                FROM trajectories WHERE "isTrainingData" = true
+            """)
+            row = cur.fetchone()
+    finally:
+        release_connection(conn)
 
     if row is None:
         return {
@@ -14,6 +14,7 @@ This package provides training infrastructure:
 
 3. **Supporting Modules**
    - `rewards.py` - Reward functions and normalization
+   - `attention.py` - Attention backend selection for model loading
    - `quality_utils.py` - Trajectory quality scoring
    - `tick_reward_attribution.py` - Granular reward attribution for multi-call ticks
 
@@ -28,6 +29,9 @@ from .archetype_trainer import (
     ArchetypeTrainingResult,
 )
 
+# Attention backend selection (no torch dependency)
+from .attention import attn_implementation
+
 # Multi-prompt dataset (no torch dependency)
 from .multi_prompt_dataset import (
     MultiPromptDatasetBuilder,
@@ -176,6 +180,7 @@ __all__ = [
     "TickRewardAttributor",
     "ValidationResult",
     "action_quality_reward",
+    "attn_implementation",
     "build_training_samples_from_tick",
     "build_trajectory_from_ticks",
     "calculate_detailed_tick_quality",
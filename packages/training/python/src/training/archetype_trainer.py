@@ -18,7 +18,9 @@ Usage:
 
 import asyncio
 import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -49,6 +51,7 @@ class ArchetypeTrainingConfig:
 
     # Output settings
     output_dir: str = "./trained_models"
+    vllm_port: int = 9001
     save_per_archetype: bool = True
 
     # Judge settings
@@ -71,6 +74,32 @@ class ArchetypeTrainingResult:
     metrics: dict
 
 
+# GPU index claimed by this worker process; 0 outside of a GPU pool
+_gpu_slot = 0
+
+
+def _claim_gpu(gpu_ids) -> None:
+    """Pool initializer: pin this worker process to one GPU before CUDA starts."""
+    global _gpu_slot
+    _gpu_slot = gpu_ids.get()
+    os.environ["CUDA_VISIBLE_DEVICES"] = str(_gpu_slot)
+
+
+def _train_archetype_in_process(
+    config: ArchetypeTrainingConfig, archetype: str
+) -> ArchetypeTrainingResult:
+    """Train one archetype in a pool worker with its own event loop."""
+    return asyncio.run(ArchetypeTrainer(config).train_archetype(archetype))
+
+
+def _cuda_device_count() -> int:
+    try:
+        import torch
+    except ImportError:
+        return 0
+    return torch.cuda.device_count()
+
+
 class ArchetypeTrainer:
     """
     Multi-archetype training orchestrator.
@@ -87,10 +116,31 @@ class ArchetypeTrainer:
         Path(self.config.output_dir).mkdir(parents=True, exist_ok=True)
         Path(self.config.log_dir).mkdir(parents=True, exist_ok=True)
 
+    def _trainer_config(self, archetype: str, slot: int):
+        """
+        Build the trainer config for one archetype.
+
+        Archetypes trained at the same time each get their own vLLM port
+        (offset by ``slot``) and checkpoint directory so they don't collide.
+        """
+        from .atropos_trainer import AtroposTrainingConfig
+
+        return AtroposTrainingConfig(
+            model_name=self.config.base_model,
+            training_steps=self.config.training_steps,
+            batch_size=self.config.batch_size,
+            learning_rate=self.config.learning_rate,
+            vllm_port=self.config.vllm_port + slot,
+            save_path=f"{self.config.output_dir}/checkpoints/{archetype}",
+            log_to_file=self.config.log_to_file,
+            log_file=f"{self.config.log_dir}/training_{archetype}.jsonl",
+        )
+
     async def train_archetype(
         self,
         archetype: str,
         trajectories: list | None = None,  # noqa: ARG002 - reserved for custom trajectories
+        slot: int | None = None,
     ) -> ArchetypeTrainingResult:
         """
         Train a single archetype.
@@ -98,11 +148,12 @@ class ArchetypeTrainer:
         Args:
             archetype: Name of the archetype to train (e.g., "trader", "scammer")
             trajectories: Optional pre-loaded trajectories. If None, loads from DB.
+            slot: vLLM port offset; defaults to the GPU claimed by this process
 
         Returns:
             ArchetypeTrainingResult with training metrics and checkpoint path
         """
-        from .atropos_trainer import AtroposTrainingConfig, JejuAtroposTrainer
+        from .atropos_trainer import JejuAtroposTrainer
         from .jeju_env import JejuEnvConfig
 
         logger.info(f"Starting training for archetype: {archetype}")
@@ -120,14 +171,7 @@ class ArchetypeTrainer:
         )
 
         # Configure trainer
-        trainer_config = AtroposTrainingConfig(
-            model_name=self.config.base_model,
-            training_steps=self.config.training_steps,
-            batch_size=self.config.batch_size,
-            learning_rate=self.config.learning_rate,
-            log_to_file=self.config.log_to_file,
-            log_file=f"{self.config.log_dir}/training_{archetype}.jsonl",
-        )
+        trainer_config = self._trainer_config(archetype, _gpu_slot if slot is None else slot)
 
         # Initialize trainer
         trainer = JejuAtroposTrainer(trainer_config)
@@ -168,7 +212,8 @@ class ArchetypeTrainer:
 
         Args:
             archetypes: List of archetype names to train
-            parallel: If True, train archetypes in parallel (requires more resources)
+            parallel: If True, train archetypes in parallel (requires more resources).
+                With several GPUs each archetype runs in its own process on its own GPU.
 
         Returns:
             List of ArchetypeTrainingResult for each archetype
@@ -176,9 +221,13 @@ class ArchetypeTrainer:
         logger.info(f"Training {len(archetypes)} archetypes: {archetypes}")
 
         if parallel:
-            # Train in parallel (requires significant resources)
-            tasks = [self.train_archetype(arch) for arch in archetypes]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            gpu_count = _cuda_device_count()
+            if gpu_count > 1:
+                results = await self._train_on_gpus(archetypes, gpu_count)
+            else:
+                # Train in parallel (requires significant resources)
+                tasks = [self.train_archetype(arch, slot=i) for i, arch in enumerate(archetypes)]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
 
             # Filter out exceptions
             valid_results = []
@@ -199,6 +248,30 @@ class ArchetypeTrainer:
                     logger.error(f"Failed to train {archetype}: {e}")
             return results
 
+    async def _train_on_gpus(
+        self, archetypes: list[str], gpu_count: int
+    ) -> list[ArchetypeTrainingResult | BaseException]:
+        """Run one training process per GPU; archetypes queue for a free GPU."""
+        ctx = multiprocessing.get_context("spawn")
+        logger.info(f"Training on {gpu_count} GPUs, one process per GPU")
+        loop = asyncio.get_running_loop()
+        with ctx.Manager() as manager:
+            gpu_ids = manager.Queue()
+            for gpu_id in range(gpu_count):
+                gpu_ids.put(gpu_id)
+
+            with ProcessPoolExecutor(
+                max_workers=gpu_count,
+                mp_context=ctx,
+                initializer=_claim_gpu,
+                initargs=(gpu_ids,),
+            ) as pool:
+                futures = [
+                    loop.run_in_executor(pool, _train_archetype_in_process, self.config, arch)
+                    for arch in archetypes
+                ]
+                return await asyncio.gather(*futures, return_exceptions=True)
+
     async def train_all_archetypes(
         self,
         parallel: bool = False,
@@ -19,11 +19,15 @@ import json
 import logging
 import math
 import os
+import selectors
 import shutil
+import socket
 import subprocess
+import sys
 import time
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Literal
 
 import numpy as np
 import requests
@@ -35,6 +39,14 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 from torch.optim import AdamW
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
+from .attention import attn_implementation
+
+# bitsandbytes is optional; it provides the opt-in 8-bit optimizer on CUDA
+try:
+    import bitsandbytes as bnb
+except ImportError:
+    bnb = None
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -56,20 +68,113 @@ def cleanup_vllm():
     global vllm_process
     if vllm_process:
         logger.info("Terminating vLLM process...")
-        vllm_process.terminate()
-        try:
-            vllm_process.wait(timeout=5)
+        if _stop_process(vllm_process):
             logger.info("vLLM process terminated.")
-        except subprocess.TimeoutExpired:
-            logger.warning("vLLM process did not terminate gracefully, killing.")
-            vllm_process.kill()
-            vllm_process.wait()
+        else:
+            logger.warning("vLLM process did not terminate gracefully, killed.")
         vllm_process = None
 
 
 atexit.register(cleanup_vllm)
 
 
+def _wait_for_port(
+    host: str, port: int, timeout: float, proc: subprocess.Popen | None = None
+) -> bool:
+    """
+    Wait until a TCP port accepts connections.
+
+    Returns False as soon as ``proc`` exits or the timeout passes, so callers
+    don't sleep a fixed interval for a server that is already up (or dead).
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _port_free(port: int) -> bool:
+    """
+    Check that nothing is listening on ``port`` by binding a throwaway socket.
+
+    SO_REUSEADDR keeps sockets left in TIME_WAIT from counting as busy.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("0.0.0.0", port))
+        except OSError:
+            return False
+    return True
+
+
+def _split_cpus(cpus: set[int]) -> tuple[set[int], set[int]]:
+    """
+    Partition ``cpus`` into (vLLM server, trainer) sets.
+
+    The server gets a quarter of the cores (at least two) and the trainer the
+    rest, so each keeps a stable cache working set. Returns empty sets when
+    there are too few cores to split.
+    """
+    ordered = sorted(cpus)
+    if len(ordered) < 4:
+        return set(), set()
+    server_count = max(2, len(ordered) // 4)
+    return set(ordered[:server_count]), set(ordered[server_count:])
+
+
+def _wait_for_exit(proc: subprocess.Popen, timeout: float) -> bool:
+    """
+    Wait up to ``timeout`` seconds, waking as soon as ``proc`` exits.
+
+    Uses a pidfd on Linux so the wait is a single blocking select; elsewhere
+    falls back to ``Popen.wait``. Returns True if the process has exited.
+    """
+    pidfd_open = getattr(os, "pidfd_open", None)
+    if pidfd_open is not None and proc.poll() is None:
+        try:
+            fd = pidfd_open(proc.pid)
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                with selectors.DefaultSelector() as sel:
+                    sel.register(fd, selectors.EVENT_READ)
+                    sel.select(timeout)
+            finally:
+                os.close(fd)
+            return proc.poll() is not None
+    try:
+        proc.wait(timeout=timeout)
+        return True
+    except subprocess.TimeoutExpired:
+        return False
+
+
+def _stop_process(proc: subprocess.Popen, grace: float = 2.0) -> bool:
+    """
+    SIGTERM ``proc``, then SIGKILL it if it is still running after ``grace``.
+
+    Returns as soon as the process exits rather than after a fixed wait, so a
+    responsive server costs nothing and a stuck one at most ``grace`` seconds.
+    Returns True if the process exited on SIGTERM.
+    """
+    if proc.poll() is not None:
+        return True
+    proc.terminate()
+    if _wait_for_exit(proc, grace):
+        return True
+    proc.kill()
+    proc.wait()
+    return False
+
+
 class AtroposTrainingConfig(BaseModel):
     """Configuration for Atropos GRPO training"""
 
@@ -86,6 +191,10 @@ class AtroposTrainingConfig(BaseModel):
     gradient_accumulation_steps: int = Field(default=8, description="Gradient accumulation steps")
     seq_len: int = Field(default=4096, description="Maximum sequence length")
     max_grad_norm: float = Field(default=1.0, description="Gradient clipping norm")
+    optim: Literal["adamw", "adamw8bit"] = Field(
+        default="adamw",
+        description="Optimizer; adamw8bit uses bitsandbytes' 8-bit states on CUDA",
+    )
 
     # Device settings
     device: str = Field(
@@ -97,6 +206,10 @@ class AtroposTrainingConfig(BaseModel):
     vllm_port: int = Field(default=9001, description="Port for vLLM inference server")
     vllm_restart_interval: int = Field(default=5, description="Restart vLLM every N steps")
     vllm_gpu_utilization: float = Field(default=0.45, description="GPU memory for vLLM")
+    cpu_layout: Literal["auto", "none"] = Field(
+        default="none",
+        description="'auto' pins vLLM and the trainer to disjoint CPU sets (Linux only)",
+    )
 
     # Checkpoint settings
     save_path: str = Field(default="./trained_models", description="Directory to save checkpoints")
@@ -137,9 +250,10 @@ class JejuAtroposTrainer:
         self.config = config
         self.model: Any = None
         self.tokenizer: Any = None
-        self.optimizer: AdamW | None = None
+        self.optimizer: torch.optim.Optimizer | None = None
         self.current_step: int = 0
         self.vllm_process: subprocess.Popen | None = None
+        self._cpu_pool: set[int] | None = None
         self.run_id: str = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
 
     def setup(self):
@@ -150,16 +264,36 @@ class JejuAtroposTrainer:
             self.config.model_name, trust_remote_code=True
         )
 
+        # Stream weights straight onto the target device instead of loading on
+        # the host and copying, which doubles peak memory on MPS/CPU boxes
         self.model = AutoModelForCausalLM.from_pretrained(
-            self.config.model_name, torch_dtype=torch.bfloat16, trust_remote_code=True
+            self.config.model_name,
+            torch_dtype=torch.bfloat16,
+            device_map={"": self.config.device},
+            low_cpu_mem_usage=True,
+            # Fused attention instead of eager: FlashAttention-2 when installed, else SDPA
+            attn_implementation=attn_implementation(str(self.config.device)),
+            trust_remote_code=True,
         )
 
         assert self.model is not None, "Failed to load model"
-        self.model.to(self.config.device)
-        self.model.gradient_checkpointing_enable()
+        self.model.gradient_checkpointing_enable(
+            gradient_checkpointing_kwargs={"use_reentrant": False}
+        )
         self.model.train()
 
-        self.optimizer = AdamW(self.model.parameters(), lr=self.config.learning_rate)
+        # This is a full fine-tune, so Adam's two moment buffers per parameter
+        # dominate memory; 8-bit states shrink them 4x vs fp32 (2x vs bf16)
+        use_8bit = self.config.optim == "adamw8bit"
+        if use_8bit and (bnb is None or not str(self.config.device).startswith("cuda")):
+            logger.warning("adamw8bit needs bitsandbytes on CUDA, falling back to AdamW")
+            use_8bit = False
+        if use_8bit and bnb is not None:
+            self.optimizer = bnb.optim.AdamW8bit(
+                self.model.parameters(), lr=self.config.learning_rate
+            )
+        else:
+            self.optimizer = AdamW(self.model.parameters(), lr=self.config.learning_rate)
 
         logger.info(f"Model loaded on {self.config.device}")
 
@@ -222,22 +356,27 @@ class JejuAtroposTrainer:
         # Terminate existing process
         if self.vllm_process:
             logger.info("Terminating existing vLLM process...")
-            self.vllm_process.terminate()
-            try:
-                self.vllm_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.vllm_process.kill()
-                self.vllm_process.wait()
+            _stop_process(self.vllm_process)
             self.vllm_process = None
 
         # Clear CUDA cache
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
+        # A stale server on the port would answer the readiness checks in place
+        # of the new one; fail now instead of after spawning
+        if not _port_free(self.config.vllm_port):
+            raise RuntimeError(
+                f"Port {self.config.vllm_port} already in use - stop the previous vLLM "
+                "server or set a different vllm_port"
+            )
+
         model_to_load = model_path or self.config.model_name
 
         cmd = [
-            "python",
+            # An absolute interpreter path is one of the conditions for Popen's
+            # posix_spawn fast path, and keeps vLLM in the trainer's environment
+            sys.executable,
             "-m",
             "vllm.entrypoints.openai.api_server",
             "--model",
@@ -256,10 +395,23 @@ class JejuAtroposTrainer:
         logger.info(f"Starting vLLM: {' '.join(cmd)}")
 
         try:
-            self.vllm_process = subprocess.Popen(cmd)
+            # Server output goes to a file: nothing reads it live, and it would
+            # otherwise interleave with the trainer's own logs
+            os.makedirs(self.config.save_path, exist_ok=True)
+            log_path = os.path.join(self.config.save_path, "vllm.log")
+            with open(log_path, "ab", buffering=0) as log_file:
+                # close_fds=False lets Popen use posix_spawn instead of fork+exec,
+                # which avoids copying this process's (model-sized) page tables.
+                # Python-opened descriptors are non-inheritable, so nothing leaks.
+                self.vllm_process = subprocess.Popen(
+                    cmd, stdout=log_file, stderr=subprocess.STDOUT, close_fds=False
+                )
             vllm_process = self.vllm_process  # Update global for cleanup
 
-            logger.info(f"vLLM started with PID: {self.vllm_process.pid}")
+            if self.config.cpu_layout == "auto":
+                self._pin_cpus(self.vllm_process.pid)
+
+            logger.info(f"vLLM started with PID: {self.vllm_process.pid}, logging to {log_path}")
 
             # Wait for server to be ready with health check
             self._wait_for_vllm_ready()
@@ -268,14 +420,44 @@ class JejuAtroposTrainer:
             logger.error(f"Failed to start vLLM: {e}")
             self.vllm_process = None
 
-    def _wait_for_vllm_ready(self, timeout: int = 120, poll_interval: float = 2.0):
+    def _pin_cpus(self, server_pid: int):
+        """Pin the vLLM server and this process to disjoint CPU sets"""
+        getaffinity = getattr(os, "sched_getaffinity", None)
+        setaffinity = getattr(os, "sched_setaffinity", None)
+        if getaffinity is None or setaffinity is None:
+            logger.info("CPU pinning is not supported on this platform, skipping")
+            return
+
+        # The trainer may already be pinned from a previous restart; split the
+        # full set it started with, not what it was left with
+        if self._cpu_pool is None:
+            self._cpu_pool = getaffinity(0)
+        server_cpus, trainer_cpus = _split_cpus(self._cpu_pool)
+        if not server_cpus:
+            return
+
+        try:
+            setaffinity(server_pid, server_cpus)
+            setaffinity(0, trainer_cpus)
+        except OSError as e:
+            logger.warning(f"Could not pin CPUs: {e}")
+            return
+        logger.info(
+            f"Pinned vLLM to {len(server_cpus)} CPUs and the trainer to {len(trainer_cpus)}"
+        )
+
+    def _wait_for_vllm_ready(self, timeout: int = 120, poll_interval: float = 0.25):
         """Wait for vLLM server to be ready, with health checks"""
         vllm_url = f"http://localhost:{self.config.vllm_port}/health"
-        start_time = time.time()
+        deadline = time.monotonic() + timeout
 
         logger.info(f"Waiting for vLLM server to be ready (timeout: {timeout}s)...")
 
-        while time.time() - start_time < timeout:
+        # Cheap socket probe until the server is listening, then /health until
+        # the model has loaded
+        _wait_for_port("127.0.0.1", self.config.vllm_port, timeout, self.vllm_process)
+
+        while time.monotonic() < deadline:
             # Check if process died
             if self.vllm_process and self.vllm_process.poll() is not None:
                 raise RuntimeError(f"vLLM process died with code {self.vllm_process.returncode}")
@@ -304,18 +486,7 @@ class JejuAtroposTrainer:
             advantage_batches: List of advantage tensors
             temperature_batches: List of temperature tensors
         """
-        max_token_len = 0
-        for item in batch_data:
-            for tokens in item.get("tokens", []):
-                max_token_len = max(max_token_len, len(tokens))
-
-        # Pad to multiple of 64 for efficiency
-        good_multiple = 64
-        if (max_token_len - 1) % good_multiple != 0:
-            max_token_len = math.ceil((max_token_len - 1) / good_multiple) * good_multiple + 1
-
-        input_ids_list = []
-        labels_list = []
+        sequences: list[tuple[np.ndarray, np.ndarray]] = []
         advantages_list = []
         temperatures_list = []
 
@@ -333,19 +504,8 @@ class JejuAtroposTrainer:
             masks_list = item.get("masks", [])
 
             for i in range(len(tokens_list)):
-                tokens = np.array(tokens_list[i])
-                masks = np.array(masks_list[i])
                 score = scores[i] if i < len(scores) else 0.0
-
-                # Pad tokens and masks
-                pad_length = max(0, max_token_len - len(tokens))
-
-                padded_tokens = np.concatenate([tokens, np.zeros(pad_length, dtype=np.int32)])
-                padded_masks = np.concatenate([masks, np.full(pad_length, -100, dtype=np.int32)])
-
-                # Create input_ids (all but last) and labels (all but first, shifted)
-                input_ids_list.append(padded_tokens[:-1])
-                labels_list.append(padded_masks[1:])
+                sequences.append((np.asarray(tokens_list[i]), np.asarray(masks_list[i])))
                 advantages_list.append(score)
 
                 # Get temperature from overrides or default to 1.0
@@ -364,14 +524,29 @@ class JejuAtroposTrainer:
         advantage_batches = []
         temperature_batches = []
 
-        num_batches = len(input_ids_list) // batch_size
+        num_batches = len(sequences) // batch_size
 
+        # Pad each batch only to its own longest sequence, rounded up to a
+        # multiple of 64 for efficiency, rather than to the longest overall
+        good_multiple = 64
         for i in range(num_batches):
             start = i * batch_size
             end = start + batch_size
 
-            token_batches.append(torch.tensor(np.stack(input_ids_list[start:end])))
-            label_batches.append(torch.tensor(np.stack(labels_list[start:end])))
+            chunk = sequences[start:end]
+            max_token_len = max(len(tokens) for tokens, _ in chunk)
+            if (max_token_len - 1) % good_multiple != 0:
+                max_token_len = math.ceil((max_token_len - 1) / good_multiple) * good_multiple + 1
+
+            padded_tokens = np.zeros((len(chunk), max_token_len), dtype=np.int64)
+            padded_masks = np.full((len(chunk), max_token_len), -100, dtype=np.int64)
+            for row, (tokens, masks) in enumerate(chunk):
+                padded_tokens[row, : len(tokens)] = tokens
+                padded_masks[row, : len(masks)] = masks
+
+            # input_ids are all but the last token, labels all but the first (shifted)
+            token_batches.append(torch.tensor(padded_tokens[:, :-1]))
+            label_batches.append(torch.tensor(padded_masks[:, 1:]))
             advantage_batches.append(
                 torch.tensor(advantages_list[start:end], dtype=torch.float32).view(-1, 1)
             )
@@ -530,7 +705,14 @@ class JejuAtroposTrainer:
                     batches_buffer = batch if isinstance(batch, list) else [batch]
                 else:
                     logger.info("Waiting for batch data...")
-                    time.sleep(2)
+                    # No batches can arrive once the inference server is gone
+                    if self.vllm_process is None:
+                        time.sleep(2)
+                    elif _wait_for_exit(self.vllm_process, 2):
+                        raise RuntimeError(
+                            f"vLLM process exited with code {self.vllm_process.returncode} "
+                            "while waiting for batch data"
+                        )
 
             # Prepare batch
             batch_data = batches_buffer.pop(0) if batches_buffer else []
@@ -603,12 +785,24 @@ def main():
     parser.add_argument("--steps", type=int, default=100, help="Training steps")
     parser.add_argument("--batch-size", type=int, default=4, help="Batch size")
     parser.add_argument("--lr", type=float, default=1e-5, help="Learning rate")
+    parser.add_argument(
+        "--optim",
+        choices=["adamw", "adamw8bit"],
+        default="adamw",
+        help="Optimizer (adamw8bit requires bitsandbytes and CUDA)",
+    )
     parser.add_argument("--save-path", default="./trained_models", help="Checkpoint directory")
     parser.add_argument("--api-url", default="http://localhost:8000", help="Atropos API URL")
     parser.add_argument("--vllm-port", type=int, default=9001, help="vLLM server port")
     parser.add_argument(
         "--log-file", default="./logs/training_metrics.jsonl", help="Metrics log file"
     )
+    parser.add_argument(
+        "--cpu-layout",
+        choices=["auto", "none"],
+        default="none",
+        help="'auto' pins vLLM and the trainer to disjoint CPU sets (Linux only)",
+    )
 
     args = parser.parse_args()
 
@@ -617,10 +811,12 @@ def main():
         training_steps=args.steps,
         batch_size=args.batch_size,
         learning_rate=args.lr,
+        optim=args.optim,
         save_path=args.save_path,
         api_url=args.api_url,
         vllm_port=args.vllm_port,
         log_file=args.log_file,
+        cpu_layout=args.cpu_layout,
     )
 
     trainer = JejuAtroposTrainer(config)
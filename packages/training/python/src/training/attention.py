@@ -0,0 +1,15 @@
+"""
+Attention Backend Selection
+
+Picks the ``attn_implementation`` passed to ``from_pretrained`` so the
+trainers and the train/test scripts load models with the same kernels.
+"""
+
+import importlib.util
+
+
+def attn_implementation(device: str) -> str:
+    """FlashAttention-2 on CUDA when flash-attn is installed, else PyTorch SDPA (never eager)."""
+    if str(device).startswith("cuda") and importlib.util.find_spec("flash_attn") is not None:
+        return "flash_attention_2"
+    return "sdpa"
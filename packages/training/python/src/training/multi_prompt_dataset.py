@@ -44,6 +44,7 @@ import logging
 from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
+from pathlib import Path
 from typing import Literal
 
 from ..models import (
@@ -55,6 +56,12 @@ from ..models import (
 
 logger = logging.getLogger(__name__)
 
+# orjson is an optional, faster drop-in for JSON encoding.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 PromptPurpose = Literal["action", "reasoning", "evaluation", "response", "other"]
 
@@ -685,8 +692,13 @@ class MultiPromptDatasetBuilder:
                 for s in dataset.samples
             ]
 
-        with open(output_path, "w") as f:
-            json.dump(data, f, indent=2)
+        if orjson is not None:
+            Path(output_path).write_bytes(
+                orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+            )
+        else:
+            with open(output_path, "w") as f:
+                json.dump(data, f, indent=2)
 
         logger.info(f"Saved dataset to {output_path}")
 
@@ -51,6 +51,16 @@ ARCHETYPE_WEIGHTS: dict[str, dict[str, float]] = {
 }
 
 
+# Decision attribute checks, compiled once (either quote style)
+_TICKER_RE = re.compile(r"""ticker=(?:"[^"]+"|'[^']+')""")
+_MARKET_ID_RE = re.compile(r"""marketId=(?:"[^"]+"|'[^']+')""")
+_AMOUNT_RE = re.compile(r"""amount=(?:"[^"]+"|'[^']+')""")
+
+# Reasoning coherence markers
+_STRUCTURE_RE = re.compile(r"(\d+[\.\):]|\-|\*|\•)")
+_NUMERIC_RE = re.compile(r"\$?\d+(?:\.\d+)?(?:%|k|K|M)?")
+
+
 def validate_xml_structure(response: str) -> float:
     """
     Validate that the response contains valid decision XML tags.
@@ -77,11 +87,9 @@ def validate_xml_structure(response: str) -> float:
         return -0.5  # Has wrappers but no decision?
 
     # Check for critical attributes (simple heuristic regex to handle both quote styles)
-    has_ticker = re.search(r'ticker="[^"]+"', response) or re.search(r"ticker='[^']+'", response)
-    has_market = re.search(r'marketId="[^"]+"', response) or re.search(
-        r"marketId='[^']+'", response
-    )
-    has_amount = re.search(r'amount="[^"]+"', response) or re.search(r"amount='[^']+'", response)
+    has_ticker = _TICKER_RE.search(response)
+    has_market = _MARKET_ID_RE.search(response)
+    has_amount = _AMOUNT_RE.search(response)
 
     # Need either ticker OR marketId, AND amount
     if (not has_ticker and not has_market) or not has_amount:
@@ -167,7 +175,7 @@ def check_reasoning_coherence(reasoning_text: str) -> float:
     text = reasoning_text
 
     # Check for structure (numbered lists, bullet points)
-    if re.search(r"(\d+[\.\):]|\-|\*|\•)", text):
+    if _STRUCTURE_RE.search(text):
         score += 0.25
 
     # Check for conclusion markers
@@ -204,7 +212,7 @@ def check_reasoning_coherence(reasoning_text: str) -> float:
         score += 0.1
 
     # Check for numeric analysis (prices, percentages)
-    if re.search(r"\$?\d+(?:\.\d+)?(?:%|k|K|M)?", text):
+    if _NUMERIC_RE.search(text):
         score += 0.15  # Contains quantitative analysis
 
     return min(max(score, 0.0), 1.0)
@@ -12,7 +12,10 @@ Also provides utilities for normalizing and comparing rewards.
 """
 
 import math
+from collections.abc import Sequence
 
+import numpy as np
+from numpy.typing import NDArray
 from pydantic import BaseModel, Field
 
 
@@ -87,6 +90,32 @@ def calculate_risk_reward(exposure: float, action_type: str) -> float:
     return 0.0
 
 
+def calculate_risk_rewards(
+    exposures: Sequence[float] | NDArray[np.floating], action_types: Sequence[str]
+) -> NDArray[np.float64]:
+    """
+    Vectorized calculate_risk_reward over a trajectory's steps.
+
+    Args:
+        exposures: Exposure per step
+        action_types: Action type per step
+
+    Returns:
+        Array of per-step penalties (-0.5 or 0.0)
+    """
+    exposures = np.asarray(exposures, dtype=np.float64)
+    if len(action_types) == 0:
+        return np.zeros(len(exposures), dtype=np.float64)
+
+    acts = np.char.lower(np.asarray(action_types, dtype=str))
+    is_buying = (
+        (np.char.find(acts, "buy") >= 0)
+        | (np.char.find(acts, "long") >= 0)
+        | (np.char.find(acts, "open") >= 0)
+    )
+    return np.where((exposures > 0.80) & is_buying, -0.5, 0.0)
+
+
 def pnl_reward(inputs: TrajectoryRewardInputs) -> float:
     """
     Compute PnL-based reward (Legacy wrapper).
@@ -218,29 +247,28 @@ def composite_reward(
     return max(-1.0, min(1.0, composite))
 
 
-def relative_scores(rewards: list[float]) -> list[float]:
+def relative_scores(rewards: Sequence[float] | NDArray[np.floating]) -> list[float]:
     """
     Convert absolute rewards to relative scores.
 
-    Maps rewards to [0, 1] based on their rank within the group.
+    Maps rewards to [0, 1] based on their rank within the group. Ties keep
+    their input order, matching a stable sort.
 
     Args:
-        rewards: List of reward values
+        rewards: Reward values, as a list or a 1-D NumPy array
 
     Returns:
         List of relative scores in [0, 1]
     """
-    if len(rewards) < 2:
-        return [0.5] * len(rewards)
-
-    sorted_indices = sorted(range(len(rewards)), key=lambda i: rewards[i])
     n = len(rewards)
+    if n < 2:
+        return [0.5] * n
 
-    scores = [0.0] * n
-    for rank, idx in enumerate(sorted_indices):
-        scores[idx] = rank / (n - 1)
+    order = np.argsort(np.asarray(rewards, dtype=np.float64), kind="stable")
+    scores = np.empty(n, dtype=np.float64)
+    scores[order] = np.arange(n) / (n - 1)
 
-    return scores
+    return scores.tolist()
 
 
 def ranking_to_scores(rankings: list[int]) -> list[float]:
@@ -249,6 +249,7 @@ class TestTrainerConfig:
         assert config.model_name == "Qwen/Qwen2.5-3B-Instruct"
         assert config.learning_rate == 1e-5
         assert config.training_steps == 100
+        assert config.optim == "adamw"
 
     def test_custom_config(self):
         from src.training import AtroposTrainingConfig
@@ -264,6 +265,28 @@ class TestTrainerConfig:
         assert config.learning_rate == 5e-6
 
 
+@requires_torch
+class TestArchetypeTrainerConfig:
+    """Test per-archetype trainer configuration (requires torch)"""
+
+    def test_concurrent_archetypes_do_not_share_port_or_checkpoints(self, tmp_path):
+        from src.training import ArchetypeTrainer, ArchetypeTrainingConfig
+
+        trainer = ArchetypeTrainer(
+            ArchetypeTrainingConfig(
+                output_dir=str(tmp_path / "models"), log_dir=str(tmp_path / "logs")
+            )
+        )
+        configs = [
+            trainer._trainer_config(archetype, slot)
+            for slot, archetype in enumerate(["trader", "scammer", "social-butterfly"])
+        ]
+
+        assert len({c.vllm_port for c in configs}) == len(configs)
+        assert len({c.save_path for c in configs}) == len(configs)
+        assert configs[0].vllm_port == 9001
+
+
 @requires_torch
 class TestEnvironmentConfig:
     """Test environment configuration (requires torch)"""